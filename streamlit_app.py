@@ -1,35 +1,44 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta, date
 import json
+import sqlite3
+import threading
+import functools
+import contextlib
+import hashlib
+import gzip
+import os
+import math
+import tempfile
+import heapq
+import bisect
+from collections import OrderedDict, Counter, defaultdict, deque
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import smtplib
+import logging
+import atexit
+import random
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import text_extraction
+try:
+    import fcntl
+except ImportError:
+    # Windows: audit log appends are then only serialized within one process
+    fcntl = None
 
-# Initialize session state
-if 'logged_in' not in st.session_state:
-    st.session_state['logged_in'] = False
-if 'documents' not in st.session_state:
-    st.session_state['documents'] = []
-if 'pending_analysis' not in st.session_state:
-    st.session_state['pending_analysis'] = []
-if 'history' not in st.session_state:
-    st.session_state['history'] = []
-if 'doc_id_counter' not in st.session_state:
-    st.session_state['doc_id_counter'] = 1
-if 'document_removal_times' not in st.session_state:
-    st.session_state['document_removal_times'] = {}
-if 'action_times' not in st.session_state:
-    st.session_state['action_times'] = []
-if 'selected_view' not in st.session_state:
-    st.session_state['selected_view'] = 'Upload'
-if 'user_actions' not in st.session_state:
-    st.session_state['user_actions'] = []
-if 'analyzed_docs' not in st.session_state:
-    st.session_state['analyzed_docs'] = set()
-if 'users' not in st.session_state:
-    st.session_state['users'] = {
+@st.cache_resource
+def get_users():
+    """User accounts, shared by every session in the process"""
+    return {
         'maxhaiti@aol.com': {
             'password': 'Admin123',
             'role': 'admin',
@@ -47,6 +56,61 @@ if 'users' not in st.session_state:
         }
         
     }
+
+class UserDirectory:
+    """Bidirectional email <-> display name index over the user accounts.
+
+    map_names() resolves a whole Series in one vectorized step (a category
+    rename for categorical input) and falls back to the email for unknown users
+    instead of raising KeyError.
+    """
+
+    def __init__(self, users):
+        self.name_by_email = {email: user['name'] for email, user in users.items()}
+        self.email_by_name = {}
+        for email, name in self.name_by_email.items():
+            self.email_by_name.setdefault(name, email)
+
+    def names(self):
+        return list(self.name_by_email.values())
+
+    def name(self, email):
+        return self.name_by_email.get(email, email)
+
+    def email_for(self, name):
+        return self.email_by_name.get(name)
+
+    def map_names(self, emails):
+        if isinstance(emails.dtype, pd.CategoricalDtype):
+            names = [self.name(email) for email in emails.cat.categories]
+            # Categories must stay unique, so two users sharing a name take the slow path
+            if len(set(names)) == len(names):
+                return emails.cat.rename_categories(names)
+            emails = emails.astype(object)
+        return emails.map(self.name_by_email).fillna(emails)
+
+@st.cache_resource
+def get_user_directory():
+    """Name index shared by every view and session"""
+    return UserDirectory(get_users())
+
+# Initialize session state
+if 'logged_in' not in st.session_state:
+    st.session_state['logged_in'] = False
+if 'pending_analysis' not in st.session_state:
+    st.session_state['pending_analysis'] = []
+if 'selected_view' not in st.session_state:
+    st.session_state['selected_view'] = 'Upload'
+if 'ingested_files' not in st.session_state:
+    st.session_state['ingested_files'] = set()
+if 'status_table_version' not in st.session_state:
+    st.session_state['status_table_version'] = 0
+if 'changed_documents' not in st.session_state:
+    st.session_state['changed_documents'] = set()
+if 'shown_analyses' not in st.session_state:
+    st.session_state['shown_analyses'] = set()
+if 'users' not in st.session_state:
+    st.session_state['users'] = get_users()
 if 'current_user' not in st.session_state:
     st.session_state['current_user'] = None
 
@@ -58,80 +122,1908 @@ STATUS_EMOJIS = {
     'Analyzed': '🔍'
 }
 
-def send_email_notification(subject, body):
+def get_setting(name, default=None):
+    """Read an optional setting from st.secrets, falling back to a default"""
     try:
-        sender_email = st.secrets["GMAIL_ADDRESS"]
-        sender_password = st.secrets["GMAIL_APP_PASSWORD"]
-        receiver_email = "jimkalinov@gmail.com"  # Admin email
+        return st.secrets[name]
+    except (KeyError, FileNotFoundError):
+        return default
 
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = receiver_email
-        msg['Subject'] = subject
+def synchronized(method):
+    """Serialize calls to a method on its instance's lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class LatencyHistogram:
+    """Call latencies in fixed, log-spaced buckets, so memory stays constant.
+
+    Quantiles are interpolated inside a bucket; each bucket bound is sqrt(2)
+    times the one below, which bounds the error of an estimate.
+    """
+
+    BOUNDS = tuple(0.001 * 2 ** (i / 2) for i in range(40))  # 1 ms .. ~12 min
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.BOUNDS[index - 1] if index else 0.0
+                upper = self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+        return self.max
+
+class Metrics:
+    """Process-wide latency histograms and counters for the app's hot paths"""
+
+    PREFIX = "signforme"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            self.histograms[name].observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def summary(self):
+        """One row per timed call: count, mean, p50/p95/p99 and max in milliseconds"""
+        with self.lock:
+            rows = []
+            for name, histogram in sorted(self.histograms.items()):
+                rows.append({
+                    'name': name,
+                    'calls': histogram.count,
+                    'mean_ms': histogram.sum / histogram.count * 1000,
+                    'p50_ms': histogram.quantile(0.50) * 1000,
+                    'p95_ms': histogram.quantile(0.95) * 1000,
+                    'p99_ms': histogram.quantile(0.99) * 1000,
+                    'max_ms': histogram.max * 1000,
+                })
+            return rows, dict(self.counters)
+
+    def to_prometheus(self):
+        """Histograms and counters in the Prometheus text exposition format"""
+        metric = f"{self.PREFIX}_call_duration_seconds"
+        lines = [f"# HELP {metric} Latency of instrumented calls.", f"# TYPE {metric} histogram"]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.BOUNDS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{name="{name}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{name="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{name="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{name="{name}"}} {histogram.count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {self.PREFIX}_{name}_total counter")
+                lines.append(f"{self.PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource
+def get_metrics():
+    return Metrics()
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch with a relative-error guarantee (DDSketch).
+
+    A value is counted in the bucket ceil(log_gamma(value)), so every quantile
+    is within ACCURACY of the true value, relatively, while storing one counter
+    per occupied bucket however many values were added. Sketches over
+    disjoint periods merge by adding bucket counts.
+    """
+
+    ACCURACY = 0.02
+    GAMMA = (1 + ACCURACY) / (1 - ACCURACY)
+    MIN_VALUE = 0.001
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(buckets or {})
+
+    @classmethod
+    def index(cls, value):
+        return math.ceil(math.log(max(value, cls.MIN_VALUE), cls.GAMMA))
+
+    @classmethod
+    def value(cls, index):
+        return 2 * cls.GAMMA ** index / (cls.GAMMA + 1)
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        index = self.index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        count = self.count
+        if not count:
+            return None
+        rank = q * (count - 1)
+        cumulative = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative > rank:
+                return self.value(index)
+
+    def mean(self):
+        count = self.count
+        return sum(self.value(index) * n for index, n in self.buckets.items()) / count if count else None
+
+    def cumulative_shares(self):
+        """(value, share of values <= value) for each occupied bucket, in order"""
+        count, cumulative, shares = self.count, 0, []
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            shares.append((self.value(index), cumulative / count))
+        return shares
+
+def instrumented(name):
+    """Record each call's latency in the process-wide metrics under name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class DocumentStore:
+    """SQLite-backed repository for documents, history, the audit log and action times.
+
+    A single instance is shared by every session (see get_store), so all public
+    methods are serialized on the instance lock. The database runs in WAL mode and
+    every write is an IMMEDIATE transaction, so several Streamlit processes on the
+    same host can share one DB_PATH without handing out duplicate document IDs or
+    applying the same status transition twice.
+    """
+
+    DOCUMENT_COLUMNS = ['id', 'name', 'status', 'upload_time', 'file_type', 'file_size',
+                        'content', 'analysis', 'uploaded_by', 'expires_at', 'content_hash']
+    HISTORY_COLUMNS = ['date', 'id', 'name', 'status', 'analysis', 'uploaded_by']
+    PROCESSING_SLOT_SECONDS = 300
+    PROCESSING_RETENTION = timedelta(days=8)
+    ALL_TIME_SLOT = -1
+
+    def __init__(self, path):
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so concurrent writers in other
+        # processes wait on busy_timeout instead of failing mid-transaction
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                upload_time TEXT NOT NULL,
+                file_type TEXT,
+                file_size INTEGER,
+                content TEXT,
+                analysis TEXT,
+                uploaded_by TEXT NOT NULL,
+                expires_at TEXT,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status);
+            CREATE INDEX IF NOT EXISTS idx_documents_uploaded_by ON documents (uploaded_by);
+            CREATE INDEX IF NOT EXISTS idx_documents_upload_time ON documents (upload_time);
+            CREATE INDEX IF NOT EXISTS idx_documents_expires_at ON documents (expires_at);
+            CREATE INDEX IF NOT EXISTS idx_documents_status_time ON documents (status, upload_time);
+            CREATE INDEX IF NOT EXISTS idx_documents_user_time ON documents (uploaded_by, status, upload_time);
+            -- The Upload page pages through unanalyzed documents only
+            CREATE INDEX IF NOT EXISTS idx_documents_unanalyzed ON documents (upload_time) WHERE analysis IS NULL;
+            CREATE INDEX IF NOT EXISTS idx_documents_user_unanalyzed
+                ON documents (uploaded_by, upload_time) WHERE analysis IS NULL;
+
+            CREATE TABLE IF NOT EXISTS history (
+                date TEXT NOT NULL,
+                id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                analysis TEXT,
+                uploaded_by TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_id ON history (id);
+            CREATE INDEX IF NOT EXISTS idx_history_date ON history (date);
+            CREATE INDEX IF NOT EXISTS idx_history_uploaded_by ON history (uploaded_by);
+
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+
+            -- Audit entries written by older versions; new ones go to the AuditLog files
+            CREATE TABLE IF NOT EXISTS user_actions (
+                timestamp TEXT NOT NULL,
+                action TEXT NOT NULL,
+                details TEXT,
+                user TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_user_actions_timestamp ON user_actions (timestamp);
+            -- Audit entry counts per action and per user, bumped once per AuditLog batch
+            CREATE TABLE IF NOT EXISTS action_counts (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (kind, name)
+            );
+
+            -- Raw processing times written by older versions; only read to backfill
+            -- processing_times below
+            CREATE TABLE IF NOT EXISTS action_times (
+                upload_time TEXT NOT NULL,
+                action_time TEXT NOT NULL
+            );
+            -- Upload-to-decision times as QuantileSketch bucket counts per 5-minute
+            -- slot of the decision time (slot -1 holds all time), so the table
+            -- stays bounded however many documents are decided
+            CREATE TABLE IF NOT EXISTS processing_times (
+                slot INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (slot, bucket)
+            );
+
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                sent_at TEXT,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt);
+            CREATE INDEX IF NOT EXISTS idx_outbox_recipient ON outbox (recipient, created_at);
+
+            -- Notifications waiting to be coalesced into one digest per recipient
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_notifications_recipient ON notifications (recipient, created_at);
+
+            -- Analytics aggregates, maintained in the same transactions as the
+            -- history writes so the dashboard never has to scan history
+            CREATE TABLE IF NOT EXISTS analytics_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            -- Days whose history changed since their Parquet partition was last written
+            CREATE TABLE IF NOT EXISTS history_dirty_days (
+                day TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS analytics_daily (
+                day TEXT NOT NULL,
+                status TEXT NOT NULL,
+                uploaded_by TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, status, uploaded_by)
+            );
+        """)
+        self._add_missing_columns('documents', {'content_hash': 'TEXT'})
+        self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash "
+            "ON documents (uploaded_by, content_hash)"
+        )
+        # For the "is this blob still used" check when documents are removed
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)")
+        with self._transaction():
+            if self.conn.execute(
+                "SELECT 1 FROM analytics_counters WHERE name = 'documents'"
+            ).fetchone() is None:
+                self._rebuild_analytics()
+            if self.conn.execute("SELECT 1 FROM processing_times LIMIT 1").fetchone() is None:
+                self._rebuild_processing_times()
+            if self.conn.execute("SELECT 1 FROM action_counts LIMIT 1").fetchone() is None:
+                self._rebuild_action_counts()
+
+    def _rebuild_analytics(self):
+        """One-off backfill of the analytics tables for databases that predate them"""
+        self.conn.execute("DELETE FROM analytics_counters")
+        self.conn.execute("DELETE FROM analytics_daily")
+        self.conn.execute("INSERT INTO analytics_counters (name, value) VALUES ('documents', 0)")
+        for row in self.conn.execute(
+            f"SELECT {', '.join(self.HISTORY_COLUMNS)} FROM history"
+        ).fetchall():
+            self._count_history_row(row['date'], row['status'].split()[0], row['uploaded_by'], 1)
+            self._bump('documents', 1)
+            if row['analysis'] is not None:
+                self._bump('analyzed', 1)
+
+    def _rebuild_processing_times(self):
+        """One-off backfill of processing_times from the raw action_times rows"""
+        self.conn.execute("DELETE FROM processing_times")
+        for row in self.conn.execute("SELECT upload_time, action_time FROM action_times").fetchall():
+            self._count_processing_time(
+                datetime.fromisoformat(row['upload_time']), datetime.fromisoformat(row['action_time'])
+            )
+
+    def _rebuild_action_counts(self):
+        """One-off backfill of action_counts from the user_actions rows of older versions"""
+        self.conn.execute("DELETE FROM action_counts")
+        for kind, column in (('action', 'action'), ('user', 'user')):
+            self.conn.execute(
+                f"INSERT INTO action_counts (kind, name, count) "
+                f"SELECT ?, {column}, COUNT(*) FROM user_actions GROUP BY {column}", (kind,)
+            )
+
+    def _count_processing_time(self, upload_time, action_time):
+        bucket = QuantileSketch.index((action_time - upload_time).total_seconds())
+        slot = int(action_time.timestamp()) // self.PROCESSING_SLOT_SECONDS
+        self.conn.executemany(
+            "INSERT INTO processing_times (slot, bucket, count) VALUES (?, ?, 1) "
+            "ON CONFLICT (slot, bucket) DO UPDATE SET count = count + 1",
+            [(slot, bucket), (self.ALL_TIME_SLOT, bucket)]
+        )
+
+    def _bump(self, name, delta):
+        self.conn.execute(
+            "INSERT INTO analytics_counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, delta)
+        )
+
+    def _mark_history_day(self, date):
+        self.conn.execute(
+            "INSERT INTO history_dirty_days (day, version) VALUES (?, 1) "
+            "ON CONFLICT (day) DO UPDATE SET version = version + 1",
+            (date[:10],)
+        )
+
+    def _count_history_row(self, date, status, uploaded_by, delta):
+        self._bump(f"status:{status}", delta)
+        self._bump(f"user:{uploaded_by}", delta)
+        self.conn.execute(
+            "INSERT INTO analytics_daily (day, status, uploaded_by, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (day, status, uploaded_by) DO UPDATE SET count = count + excluded.count",
+            (date[:10], status, uploaded_by, delta)
+        )
+
+    def _add_missing_columns(self, table, columns):
+        """Bring databases created by older versions up to the current schema"""
+        existing = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        for name, definition in columns.items():
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    @staticmethod
+    def _doc_from_row(row):
+        doc = dict(row)
+        doc['upload_time'] = datetime.fromisoformat(doc['upload_time'])
+        if doc['expires_at']:
+            doc['expires_at'] = datetime.fromisoformat(doc['expires_at'])
+        return doc
+
+    @synchronized
+    def next_doc_id(self):
+        with self._transaction():
+            self.conn.execute(
+                "INSERT OR IGNORE INTO counters (name, value) VALUES ('doc_id', 0)"
+            )
+            self.conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'doc_id'")
+            value = self.conn.execute(
+                "SELECT value FROM counters WHERE name = 'doc_id'"
+            ).fetchone()[0]
+        return f"SIGN{value:03d}"
+
+    @synchronized
+    def add_document(self, doc, history_entry):
+        row = dict(doc, upload_time=doc['upload_time'].isoformat(sep=' '), expires_at=None)
+        with self._transaction():
+            self.conn.execute(
+                f"INSERT INTO documents ({', '.join(self.DOCUMENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.DOCUMENT_COLUMNS))})",
+                [row.get(col) for col in self.DOCUMENT_COLUMNS]
+            )
+            self.conn.execute(
+                f"INSERT INTO history ({', '.join(self.HISTORY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.HISTORY_COLUMNS))})",
+                [history_entry.get(col) for col in self.HISTORY_COLUMNS]
+            )
+            self._bump('documents', 1)
+            self._count_history_row(
+                history_entry['date'], doc['status'], history_entry['uploaded_by'], 1
+            )
+            self._mark_history_day(history_entry['date'])
+
+    @synchronized
+    def get_document(self, doc_id):
+        row = self.conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return self._doc_from_row(row) if row else None
+
+    @synchronized
+    def find_document_by_hash(self, uploaded_by, content_hash):
+        row = self.conn.execute(
+            "SELECT * FROM documents WHERE uploaded_by = ? AND content_hash = ?",
+            (uploaded_by, content_hash)
+        ).fetchone()
+        return self._doc_from_row(row) if row else None
+
+    @staticmethod
+    def _document_filters(status, uploaded_by, analyzed):
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if uploaded_by is not None:
+            clauses.append("uploaded_by = ?")
+            params.append(uploaded_by)
+        if analyzed is not None:
+            clauses.append("analysis IS NOT NULL" if analyzed else "analysis IS NULL")
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    @synchronized
+    def list_documents(self, status=None, uploaded_by=None, analyzed=None, limit=None, offset=0):
+        where, params = self._document_filters(status, uploaded_by, analyzed)
+        page = ""
+        if limit is not None:
+            page = "LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        rows = self.conn.execute(
+            f"SELECT * FROM documents {where} ORDER BY upload_time {page}", params
+        ).fetchall()
+        return [self._doc_from_row(row) for row in rows]
+
+    @synchronized
+    def count_documents(self, status=None, uploaded_by=None, analyzed=None):
+        where, params = self._document_filters(status, uploaded_by, analyzed)
+        return self.conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+
+    @synchronized
+    def is_analyzed(self, doc_id):
+        row = self.conn.execute(
+            "SELECT 1 FROM history WHERE id = ? AND analysis IS NOT NULL", (doc_id,)
+        ).fetchone()
+        return row is not None
+
+    @synchronized
+    def analytics_summary(self):
+        """Totals for the dashboard: documents, analyzed, status counts and per-user counts"""
+        summary = {'documents': 0, 'analyzed': 0, 'status': {}, 'users': {}}
+        for name, value in self.conn.execute("SELECT name, value FROM analytics_counters"):
+            kind, _, key = name.partition(':')
+            if key:
+                if value:
+                    summary['status' if kind == 'status' else 'users'][key] = value
+            else:
+                summary[kind] = value
+        return summary
 
-        msg.attach(MIMEText(body, 'plain'))
+    @synchronized
+    def daily_analytics(self, day=None):
+        """Per (day, status, uploaded_by) history counts, optionally for a single day"""
+        query = "SELECT day, status, uploaded_by, count FROM analytics_daily WHERE count != 0"
+        params = ()
+        if day is not None:
+            query += " AND day = ?"
+            params = (day.isoformat(),)
+        return [dict(row) for row in self.conn.execute(query, params)]
 
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-        server.quit()
+    @synchronized
+    def set_analyses(self, analyses):
+        """Write several {doc_id: analysis} results in one transaction"""
+        rows = [(analysis, doc_id) for doc_id, analysis in analyses.items()]
+        with self._transaction():
+            self.conn.executemany("UPDATE documents SET analysis = ? WHERE id = ?", rows)
+            cursor = self.conn.executemany(
+                "UPDATE history SET analysis = ? WHERE id = ? AND analysis IS NULL", rows
+            )
+            self._bump('analyzed', cursor.rowcount)
+            self.conn.executemany(
+                "INSERT INTO history_dirty_days (day, version) "
+                "SELECT substr(date, 1, 10), 1 FROM history WHERE id = ? "
+                "ON CONFLICT (day) DO UPDATE SET version = version + 1",
+                [(doc_id,) for doc_id in analyses]
+            )
+
+    def _transition(self, doc_id, status, date, expected_status):
+        cursor = self.conn.execute(
+            "UPDATE documents SET status = ? WHERE id = ? AND status = ?",
+            (status, doc_id, expected_status)
+        )
+        if cursor.rowcount == 0:
+            return False
+        previous = self.conn.execute(
+            "SELECT date, status, uploaded_by FROM history WHERE id = ?", (doc_id,)
+        ).fetchall()
+        self.conn.execute(
+            "UPDATE history SET status = ?, date = ? WHERE id = ?",
+            (f"{status} {STATUS_EMOJIS[status]}", date, doc_id)
+        )
+        for row in previous:
+            self._count_history_row(row['date'], row['status'].split()[0], row['uploaded_by'], -1)
+            self._count_history_row(date, status, row['uploaded_by'], 1)
+            self._mark_history_day(row['date'])
         return True
-    except Exception as e:
-        st.error(f"Failed to send email: {str(e)}")
-        return False
 
-def extract_text_content(uploaded_file):
-    """Attempt to extract text content from uploaded file"""
-    try:
-        content = uploaded_file.read()
+    @synchronized
+    def set_status(self, doc_id, status, action_time, expected_status='Pending'):
+        """Move a document from expected_status to status; False if it was already moved"""
+        return bool(self.set_statuses([doc_id], status, action_time, expected_status))
+
+    @synchronized
+    def set_statuses(self, doc_ids, status, action_time, expected_status='Pending'):
+        """Move documents from expected_status to status in one transaction.
+
+        Returns the ids that moved; the others were already decided elsewhere.
+        """
+        date = action_time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction():
+            moved = [doc_id for doc_id in doc_ids
+                     if self._transition(doc_id, status, date, expected_status)]
+            if moved:
+                self._mark_history_day(date)
+        return moved
+
+    @synchronized
+    def schedule_removal(self, doc_id, expiration_time):
+        """Set or, with None, clear the time a document is removed at"""
+        self.schedule_removals([doc_id], expiration_time)
+
+    @synchronized
+    def schedule_removals(self, doc_ids, expiration_time):
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE documents SET expires_at = ? WHERE id = ?",
+                [(expiration_time.isoformat(sep=' ') if expiration_time else None, doc_id)
+                 for doc_id in doc_ids]
+            )
+
+    @synchronized
+    def list_expirations(self):
+        rows = self.conn.execute(
+            "SELECT expires_at, id FROM documents WHERE expires_at IS NOT NULL"
+        ).fetchall()
+        return [(datetime.fromisoformat(expires_at), doc_id) for expires_at, doc_id in rows]
+
+    @synchronized
+    def remove_documents(self, doc_ids, current_time):
+        """Delete the given documents if they are still due; a rescheduled document is kept.
+
+        Returns the content hashes no remaining document refers to, whose blobs
+        can go.
+        """
+        with self._transaction():
+            hashes = set()
+            for doc_id in doc_ids:
+                row = self.conn.execute(
+                    "SELECT content_hash FROM documents "
+                    "WHERE id = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                    (doc_id, current_time.isoformat(sep=' '))
+                ).fetchone()
+                if row is None:
+                    continue
+                self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                if row['content_hash']:
+                    hashes.add(row['content_hash'])
+            return self.unreferenced_hashes(hashes)
+
+    @synchronized
+    def unreferenced_hashes(self, hashes):
+        """The content hashes in hashes that no document refers to"""
+        return [content_hash for content_hash in hashes if not self.conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM documents WHERE content_hash = ?)", (content_hash,)
+        ).fetchone()[0]]
+
+    @synchronized
+    def has_history(self):
+        return self.conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is not None
+
+    @synchronized
+    def list_history(self, start=None, end=None):
+        """History rows, optionally limited to the dates start..end (inclusive)"""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            clauses.append("date < ?")
+            params.append((end + timedelta(days=1)).isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self.HISTORY_COLUMNS)} FROM history {where} ORDER BY date", params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @synchronized
+    def dirty_history_days(self, start=None, end=None):
+        """[(day, version)] of days whose history partition needs rewriting"""
+        rows = self.conn.execute(
+            "SELECT day, version FROM history_dirty_days WHERE day >= ? AND day <= ?",
+            ((start or date.min).isoformat(), (end or date.max).isoformat())
+        ).fetchall()
+        return [(date.fromisoformat(day), version) for day, version in rows]
+
+    @synchronized
+    def clear_history_day(self, day, version):
+        """Mark a day's partition current, unless the day changed again since version"""
+        with self._transaction():
+            self.conn.execute(
+                "DELETE FROM history_dirty_days WHERE day = ? AND version = ?",
+                (day.isoformat(), version)
+            )
+
+    @synchronized
+    def mark_all_history_days_dirty(self):
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO history_dirty_days (day, version) "
+                "SELECT DISTINCT substr(date, 1, 10), 1 FROM history WHERE true "
+                "ON CONFLICT (day) DO UPDATE SET version = version + 1"
+            )
+
+    @synchronized
+    def count_actions(self, entries):
+        """Add a batch of audit entries to the per-action and per-user counts"""
+        counts = Counter()
+        for entry in entries:
+            counts['action', entry['action']] += 1
+            counts['user', entry['user']] += 1
+        with self._transaction():
+            self.conn.executemany(
+                "INSERT INTO action_counts (kind, name, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (kind, name) DO UPDATE SET count = count + excluded.count",
+                [(kind, name, count) for (kind, name), count in counts.items()]
+            )
+
+    @synchronized
+    def action_counts(self):
+        """{'action': {action: count}, 'user': {email: count}} over the whole audit trail"""
+        counts = {'action': {}, 'user': {}}
+        for row in self.conn.execute("SELECT kind, name, count FROM action_counts"):
+            counts[row['kind']][row['name']] = row['count']
+        return counts
+
+    @synchronized
+    def recent_actions(self, limit):
+        """The newest audit entries written by older versions, oldest first"""
+        rows = self.conn.execute(
+            "SELECT timestamp, action, details, user FROM user_actions ORDER BY timestamp DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    @synchronized
+    def record_action_time(self, upload_time, action_time):
+        self.record_action_times([(upload_time, action_time)])
+
+    @synchronized
+    def record_action_times(self, times):
+        """Add (upload_time, action_time) pairs to the processing-time sketches"""
+        if not times:
+            return
+        latest = max(action_time for _, action_time in times)
+        oldest = int((latest - self.PROCESSING_RETENTION).timestamp()) // self.PROCESSING_SLOT_SECONDS
+        with self._transaction():
+            for upload_time, action_time in times:
+                self._count_processing_time(upload_time, action_time)
+            # Slots older than the longest window are only needed in the all-time row
+            self.conn.execute(
+                "DELETE FROM processing_times WHERE slot >= 0 AND slot < ?", (oldest,)
+            )
+
+    @synchronized
+    def processing_time_sketch(self, since=None):
+        """QuantileSketch of processing times (seconds) for decisions made since since, or ever"""
+        if since is None:
+            rows = self.conn.execute(
+                "SELECT bucket, count FROM processing_times WHERE slot = ?", (self.ALL_TIME_SLOT,)
+            )
+        else:
+            rows = self.conn.execute(
+                "SELECT bucket, SUM(count) FROM processing_times WHERE slot >= ? GROUP BY bucket",
+                (int(since.timestamp()) // self.PROCESSING_SLOT_SECONDS,)
+            )
+        return QuantileSketch(dict(rows.fetchall()))
+
+    def _enqueue_email(self, recipient, subject, body, created_at):
+        self.conn.execute(
+            "INSERT INTO outbox (recipient, subject, body, next_attempt, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (recipient, subject, body, created_at.isoformat(sep=' '), created_at.isoformat(sep=' '))
+        )
+
+    @synchronized
+    def enqueue_email(self, recipient, subject, body, created_at):
+        with self._transaction():
+            self._enqueue_email(recipient, subject, body, created_at)
+
+    @synchronized
+    def queue_notification(self, recipient, kind, subject, body, created_at):
+        """Hold a notification back for the recipient's next digest"""
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO notifications (recipient, kind, subject, body, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (recipient, kind, subject, body, created_at.isoformat(sep=' '))
+            )
+
+    @synchronized
+    def digest_recipients(self, before):
+        """Recipients whose oldest held notification was queued at or before `before`"""
+        rows = self.conn.execute(
+            "SELECT recipient FROM notifications GROUP BY recipient HAVING MIN(created_at) <= ?",
+            (before.isoformat(sep=' '),)
+        ).fetchall()
+        return [row['recipient'] for row in rows]
+
+    @synchronized
+    def count_emails_since(self, recipient, since):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE recipient = ? AND created_at > ?",
+            (recipient, since.isoformat(sep=' '))
+        ).fetchone()[0]
+
+    @synchronized
+    def release_digest(self, recipient, compose, now):
+        """Move all of recipient's held notifications into one outbox message.
+
+        compose turns the notification rows into (subject, body). Taking and
+        deleting the rows in one transaction means workers in other processes
+        never send the same notification twice. Returns how many were sent.
+        """
+        with self._transaction():
+            rows = [dict(row) for row in self.conn.execute(
+                "SELECT * FROM notifications WHERE recipient = ? ORDER BY created_at, id", (recipient,)
+            )]
+            if not rows:
+                return 0
+            self.conn.execute("DELETE FROM notifications WHERE recipient = ?", (recipient,))
+            self._enqueue_email(recipient, *compose(rows), now)
+        return len(rows)
+
+    @synchronized
+    def count_notifications(self):
+        return self.conn.execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+
+    @synchronized
+    def claim_due_emails(self, now, lease, limit=20):
+        """Lease due outbox messages to the caller so other workers skip them"""
+        with self._transaction():
+            rows = self.conn.execute(
+                "SELECT * FROM outbox WHERE status = 'queued' AND next_attempt <= ? "
+                "ORDER BY next_attempt LIMIT ?",
+                (now.isoformat(sep=' '), limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                [((now + lease).isoformat(sep=' '), row['id']) for row in rows]
+            )
+        return [dict(row) for row in rows]
+
+    @synchronized
+    def mark_email_sent(self, message_id, sent_at):
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (sent_at.isoformat(sep=' '), message_id)
+            )
+
+    @synchronized
+    def mark_email_failed(self, message_id, error, next_attempt=None):
+        """Record a failed attempt; without next_attempt the message is given up on"""
+        with self._transaction():
+            if next_attempt is None:
+                self.conn.execute(
+                    "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? "
+                    "WHERE id = ?",
+                    (error, message_id)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt = ? "
+                    "WHERE id = ?",
+                    (error, next_attempt.isoformat(sep=' '), message_id)
+                )
+
+    @synchronized
+    def count_emails(self, status='queued'):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status = ?", (status,)
+        ).fetchone()[0]
+
+@st.cache_resource
+def get_store():
+    """Process-wide document store shared by every session"""
+    return DocumentStore(get_setting("DB_PATH", "signforme.db"))
+
+if 'store' not in st.session_state:
+    st.session_state['store'] = get_store()
+
+class HistoryArchive:
+    """Typed, columnar copy of the history, one Parquet file per day.
+
+    Timestamps are native, and status and uploaded_by are dictionary-encoded
+    (categorical in pandas). The SQLite history stays the source of truth: writes
+    mark their day dirty, and read() rewrites only the dirty partitions inside
+    the requested range before loading just the days in that range.
+    """
+
+    SCHEMA = pa.schema([
+        ('date', pa.timestamp('s')),
+        ('id', pa.string()),
+        ('name', pa.string()),
+        ('status', pa.dictionary(pa.int8(), pa.string())),
+        ('analysis', pa.string()),
+        ('uploaded_by', pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+    def __init__(self, store, directory):
+        self.store = store
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+            # First run against an existing database: build every partition lazily
+            store.mark_all_history_days_dirty()
+
+    def partition_path(self, day):
+        return os.path.join(self.directory, f"day={day.isoformat()}.parquet")
+
+    def _write_partition(self, day):
+        rows = self.store.list_history(day, day)
+        path = self.partition_path(day)
+        if not rows:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        table = pa.table({
+            'date': [datetime.strptime(row['date'], "%Y-%m-%d %H:%M:%S") for row in rows],
+            'id': [row['id'] for row in rows],
+            'name': [row['name'] for row in rows],
+            'status': [row['status'].split()[0] for row in rows],
+            'analysis': [row['analysis'] for row in rows],
+            'uploaded_by': [row['uploaded_by'] for row in rows],
+        }).cast(self.SCHEMA)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def refresh(self, start=None, end=None):
+        for day, version in self.store.dirty_history_days(start, end):
+            self._write_partition(day)
+            self.store.clear_history_day(day, version)
+
+    def partition_paths(self, start, end):
+        """Up-to-date partition files for the days start..end (inclusive)"""
+        self.refresh(start, end)
+        days = (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+        return [path for path in map(self.partition_path, days) if os.path.exists(path)]
+
+    def fingerprint(self, start, end):
+        """Changes whenever any partition in start..end is rewritten"""
+        fingerprint = []
+        for path in self.partition_paths(start, end):
+            stat = os.stat(path)
+            fingerprint.append([os.path.basename(path), stat.st_mtime_ns, stat.st_size])
+        return fingerprint
+
+    def read(self, start, end):
+        """History rows dated start..end (inclusive) as a typed DataFrame"""
+        paths = self.partition_paths(start, end)
+        if not paths:
+            return self.SCHEMA.empty_table().to_pandas()
+        table = pa.concat_tables(pq.read_table(path, schema=self.SCHEMA) for path in paths)
+        return table.unify_dictionaries().to_pandas()
+
+    def iter_batches(self, start, end, uploaded_by=None, batch_size=50000):
+        """History rows dated start..end as DataFrames of at most batch_size rows"""
+        for path in self.partition_paths(start, end):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                df = batch.to_pandas()
+                if uploaded_by is not None:
+                    df = df[df['uploaded_by'] == uploaded_by]
+                if not df.empty:
+                    yield df
+
+@st.cache_resource
+def get_history_archive():
+    return HistoryArchive(get_store(), get_setting("HISTORY_DIR", "history_parquet"))
+
+def present_history(df):
+    """History rows as users see them: names instead of emails, status emojis"""
+    df = df.copy()
+    df['uploaded_by'] = get_user_directory().map_names(df['uploaded_by'])
+    df['status'] = df['status'].cat.rename_categories(
+        lambda status: f"{status} {STATUS_EMOJIS[status]}"
+    )
+    return df
+
+class HistoryExporter:
+    """Writes filtered history to CSV, JSON or Parquet files, one batch at a time.
+
+    Rows stream from the archive's partitions straight into the (optionally
+    gzipped) file, so an export never holds the whole range in memory. Files
+    are kept, keyed by the filters and the partitions they were built from,
+    so exporting the same range again is free until its history changes.
+    """
+
+    FORMATS = {
+        'csv': "text/csv",
+        'json': "application/json",
+        'parquet': "application/vnd.apache.parquet",
+    }
+    SCHEMA = pa.schema([
+        ('date', pa.timestamp('s')),
+        ('id', pa.string()),
+        ('name', pa.string()),
+        ('status', pa.string()),
+        ('analysis', pa.string()),
+        ('uploaded_by', pa.string()),
+    ])
+
+    def __init__(self, archive, directory, max_files=20, batch_size=50000):
+        self.archive = archive
+        self.directory = directory
+        self.max_files = max_files
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, start, end, uploaded_by=None, fmt='csv', compress=False):
+        """Path of the export for these filters, written only if not already cached"""
+        if fmt == 'parquet':
+            # Parquet pages are compressed already
+            compress = False
+        key = hashlib.sha256(json.dumps([
+            start.isoformat(), end.isoformat(), uploaded_by, fmt, compress,
+            self.archive.fingerprint(start, end)
+        ]).encode()).hexdigest()
+        path = os.path.join(self.directory, f"{key[:32]}.{fmt}{'.gz' if compress else ''}")
+        with self.lock:
+            if os.path.exists(path):
+                os.utime(path)
+                return path
+            tmp_path = f"{path}.tmp"
+            batches = (present_history(df) for df in
+                       self.archive.iter_batches(start, end, uploaded_by, self.batch_size))
+            if fmt == 'parquet':
+                self._write_parquet(tmp_path, batches)
+            else:
+                opener = gzip.open if compress else open
+                with opener(tmp_path, 'wt', encoding='utf-8', newline='') as f:
+                    if fmt == 'csv':
+                        self._write_csv(f, batches)
+                    else:
+                        self._write_json(f, batches)
+            os.replace(tmp_path, path)
+            self._evict()
+        return path
+
+    def _write_csv(self, f, batches):
+        header = True
+        for df in batches:
+            df.to_csv(f, header=header, index=False)
+            header = False
+        if header:
+            f.write(",".join(self.SCHEMA.names) + "\n")
+
+    def _write_json(self, f, batches):
+        # One JSON array, written a batch of records at a time
+        f.write("[")
+        separator = ""
+        for df in batches:
+            f.write(separator + df.to_json(orient='records', date_format='iso')[1:-1])
+            separator = ","
+        f.write("]")
+
+    def _write_parquet(self, path, batches):
+        with pq.ParquetWriter(path, self.SCHEMA) as writer:
+            for df in batches:
+                df = df.astype({'status': str, 'uploaded_by': str})
+                writer.write_table(pa.Table.from_pandas(df, schema=self.SCHEMA, preserve_index=False))
+
+    def _evict(self):
+        exports = sorted(
+            (entry for entry in os.scandir(self.directory)
+             if entry.is_file() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in exports[:-self.max_files]:
+            os.remove(entry.path)
+
+@st.cache_resource
+def get_history_exporter():
+    return HistoryExporter(
+        get_history_archive(),
+        get_setting("EXPORT_DIR", "exports"),
+        max_files=int(get_setting("EXPORT_CACHE_FILES", 20)),
+        batch_size=int(get_setting("EXPORT_BATCH_ROWS", 50000))
+    )
+
+def compose_digest(notifications):
+    """(subject, body) of one email covering the given notification rows"""
+    if len(notifications) == 1:
+        return notifications[0]['subject'], notifications[0]['body']
+    kinds = Counter(notification['kind'] for notification in notifications)
+    summary = ", ".join(f"{count} {kind}" for kind, count in kinds.most_common())
+    sections = "\n".join(
+        f"--- {notification['subject']} ({notification['created_at'][:19]}) ---\n{notification['body'].strip()}\n"
+        for notification in notifications
+    )
+    subject = f"SignForMe.AI digest: {len(notifications)} notifications"
+    body = f"""
+{len(notifications)} notifications since {notifications[0]['created_at'][:19]} ({summary}):
+
+{sections}"""
+    return subject, body
+
+class NotificationWorker(threading.Thread):
+    """Background thread that drains the outbox over one reused SMTP connection.
+
+    Failed sends are retried with jittered exponential backoff and stay in the
+    outbox across restarts. Messages are leased while in flight, so workers in
+    several processes can share one outbox.
+
+    Non-urgent notifications are held in the notifications table and coalesced
+    into one digest per recipient once the oldest has waited digest_window. A
+    recipient who already got max_per_hour emails in the last hour keeps
+    accumulating until the cap frees up, so bursts cost one email, not one each.
+    """
+
+    POLL_INTERVAL = 5
+    IDLE_TIMEOUT = 120
+    LEASE = timedelta(minutes=2)
+    MAX_ATTEMPTS = 8
+    BASE_BACKOFF = 2
+    MAX_BACKOFF = 900
+    ERROR_BACKOFF = 30
+
+    def __init__(self, store, host, port, sender, password=None, use_tls=True,
+                 digest_window=timedelta(minutes=5), max_per_hour=0):
+        super().__init__(name="notification-worker", daemon=True)
+        self.store = store
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.use_tls = use_tls
+        self.digest_window = digest_window
+        self.max_per_hour = max_per_hour
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self._server = None
+        self._last_used = None
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def release_digests(self, now):
+        for recipient in self.store.digest_recipients(now - self.digest_window):
+            if (self.max_per_hour and
+                    self.store.count_emails_since(recipient, now - timedelta(hours=1)) >= self.max_per_hour):
+                continue
+            self.store.release_digest(recipient, compose_digest, now)
+
+    def _poll(self):
+        """Release due digests and deliver due messages; False if there was nothing to send"""
+        self.release_digests(datetime.now())
+        messages = self.store.claim_due_emails(datetime.now(), self.LEASE)
+        for message in messages:
+            self._deliver(message)
+        return bool(messages)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                busy = self._poll()
+            except Exception:
+                # Typically "database is locked" while another process writes;
+                # leased messages come back once their lease runs out
+                logging.exception("Notification worker iteration failed, retrying in %ds", self.ERROR_BACKOFF)
+                self._disconnect()
+                self.stopped.wait(self.ERROR_BACKOFF)
+                continue
+            if not busy:
+                self._close_if_idle()
+                self.wake.wait(self.POLL_INTERVAL)
+                self.wake.clear()
+        self._disconnect()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            server.starttls()
+        if self.password:
+            server.login(self.sender, self.password)
+        return server
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _close_if_idle(self):
+        if self._server is not None and datetime.now() - self._last_used > timedelta(seconds=self.IDLE_TIMEOUT):
+            self._disconnect()
+
+    def _send(self, msg):
+        reused = self._server is not None
+        if not reused:
+            self._server = self._connect()
         try:
-            return content.decode('utf-8')
-        except UnicodeDecodeError:
-            return content.decode('latin-1')
-    except Exception as e:
-        st.warning(f"Note: File content might not be perfectly extracted. Proceeding with best effort.")
-        return str(content)
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            if not reused:
+                raise
+            # The pooled connection went stale while idle; retry once on a fresh one
+            self._server = self._connect()
+            self._server.send_message(msg)
+        self._last_used = datetime.now()
 
-def analyze_with_claude(text):
-    try:
-        headers = {
-            "x-api-key": st.secrets["CLAUDE_API_KEY"],
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json",
-        }
-        
-        prompt = """Brief summary of the document (max 2-3 sentences)
+    def _deliver(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = message['recipient']
+        msg['Subject'] = message['subject']
+        msg.attach(MIMEText(message['body'], 'plain'))
+
+        try:
+            self._send(msg)
+        except Exception as e:
+            self._disconnect()
+            attempts = message['attempts'] + 1
+            if attempts >= self.MAX_ATTEMPTS:
+                logging.error("Giving up on email %s after %d attempts: %s", message['id'], attempts, e)
+                self.store.mark_email_failed(message['id'], str(e))
+            else:
+                delay = min(self.MAX_BACKOFF, self.BASE_BACKOFF * 2 ** attempts) * random.uniform(0.5, 1)
+                logging.warning("Email %s failed, retrying in %.0fs: %s", message['id'], delay, e)
+                self.store.mark_email_failed(
+                    message['id'], str(e), datetime.now() + timedelta(seconds=delay)
+                )
+        else:
+            self.store.mark_email_sent(message['id'], datetime.now())
+
+@st.cache_resource
+def get_notification_worker():
+    """Start the process-wide notification worker"""
+    worker = NotificationWorker(
+        get_store(),
+        host=get_setting("SMTP_HOST", "smtp.gmail.com"),
+        port=int(get_setting("SMTP_PORT", 587)),
+        sender=get_setting("GMAIL_ADDRESS"),
+        password=get_setting("GMAIL_APP_PASSWORD"),
+        use_tls=get_setting("SMTP_STARTTLS", True),
+        digest_window=timedelta(minutes=float(get_setting("NOTIFICATION_DIGEST_MINUTES", 5))),
+        max_per_hour=int(get_setting("NOTIFICATION_MAX_PER_HOUR", 12))
+    )
+    worker.start()
+    return worker
+
+def urgent_notification_kinds():
+    """NOTIFICATION_URGENT_KINDS as a set; a list or a comma-separated string"""
+    kinds = get_setting("NOTIFICATION_URGENT_KINDS", [])
+    if isinstance(kinds, str):
+        kinds = kinds.split(",")
+    return {kind.strip() for kind in kinds if kind.strip()}
+
+@instrumented("send_email_notification")
+def send_email_notification(subject, body, kind, urgent=False):
+    """Queue an email to the admin; delivery happens on the notification worker.
+
+    Unless urgent (or kind is listed in NOTIFICATION_URGENT_KINDS, empty by
+    default), the email waits to go out in the admin's next digest. Urgent
+    emails skip the digest window but not NOTIFICATION_MAX_PER_HOUR: past the
+    cap they wait for the next digest like any other.
+    """
+    receiver_email = get_setting("ADMIN_EMAIL", "jimkalinov@gmail.com")
+    store = st.session_state['store']
+    worker = get_notification_worker()
+    now = datetime.now()
+    capped = (worker.max_per_hour and
+              store.count_emails_since(receiver_email, now - timedelta(hours=1)) >= worker.max_per_hour)
+    if (urgent or kind in urgent_notification_kinds()) and not capped:
+        store.enqueue_email(receiver_email, subject, body, now)
+        worker.wake.set()
+    else:
+        store.queue_notification(receiver_email, kind, subject, body, now)
+        if not worker.digest_window:
+            worker.wake.set()
+    return True
+
+class BlobStore:
+    """Content-addressed file store: each upload is kept once, named by its SHA-256"""
+
+    CHUNK_SIZE = 1024 * 1024
+    GRACE = 600
+
+    def __init__(self, directory):
+        # Absolute, because extraction workers resolve these paths in other processes
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, content_hash):
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def text_path(self, content_hash):
+        """Where the extracted text of a blob is cached"""
+        return os.path.join(self.directory, 'text', content_hash[:2], f"{content_hash}.txt")
+
+    def put(self, fileobj):
+        """Stream fileobj into the store in chunks; returns (content_hash, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        fileobj.seek(0)
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as tmp:
+            for chunk in iter(lambda: fileobj.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+        path = self.path(content_hash)
+        try:
+            # Touching the blob keeps delete() from removing it while it is reused
+            os.utime(path)
+            os.remove(tmp.name)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+        return content_hash, size
+
+    def delete(self, content_hash):
+        """Remove a blob and its extracted text, unless it was stored or reused within GRACE.
+
+        The caller has checked that no document refers to the blob, but an
+        upload of the same content may be about to, so recently touched blobs
+        are kept. Returns False for those, for the caller to retry later.
+        """
+        path = self.path(content_hash)
+        try:
+            if time.time() - os.path.getmtime(path) < self.GRACE:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.text_path(content_hash))
+        return True
+
+@st.cache_resource
+def get_blob_store():
+    return BlobStore(get_setting("BLOB_DIR", "blobs"))
+
+@st.cache_resource
+def get_extraction_pool():
+    """Process pool for CPU-bound text extraction, so PDF/DOCX parsing doesn't hold the GIL"""
+    # spawn rather than fork: the Streamlit server process is heavily multithreaded
+    return ProcessPoolExecutor(
+        max_workers=int(get_setting("EXTRACTION_WORKERS", 2)),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+def start_text_extraction(doc, blobs=None, pool=None):
+    """Begin extracting a document's text in the background; returns a future or None if cached"""
+    blobs = blobs or get_blob_store()
+    text_path = blobs.text_path(doc['content_hash'])
+    if os.path.exists(text_path):
+        return None
+    pool = pool or get_extraction_pool()
+    return pool.submit(
+        text_extraction.extract_to_file, blobs.path(doc['content_hash']), doc['file_type'], text_path
+    )
+
+class NoTextError(Exception):
+    """Raised when a document yields no text to analyze"""
+
+@instrumented("extract_text_content")
+def extract_text_content(doc, blobs=None, pool=None):
+    """Load the text of a stored document; only called when the text is actually needed.
+
+    Text is extracted once per content hash by the registered extractor for the
+    document's MIME type (see text_extraction) and read back from a memory map.
+    Raises NoTextError when there is none, rather than analyzing nothing.
+    """
+    if doc.get('content') is not None:
+        # Documents stored before the blob store kept their text inline
+        return doc['content']
+    blobs = blobs or get_blob_store()
+    future = start_text_extraction(doc, blobs, pool)
+    if future is not None:
+        future.result()
+    text = text_extraction.extract_plain_text(blobs.text_path(doc['content_hash']))
+    if not text.strip():
+        raise NoTextError(f"Could not extract text from {doc['name']}")
+    return text
+
+CLAUDE_MODEL = "claude-3-opus-20240229"
+
+# Bump PROMPT_VERSION whenever one of the prompts below changes so cached analyses are not reused
+PROMPT_VERSION = 1
+ANALYSIS_PROMPT = """Brief summary of the document (max 2-3 sentences)
 
 Please keep the response concise and focused.
 
 Document content:
 {text}"""
-        
-        data = {
-            "model": "claude-3-opus-20240229",
-            "messages": [
-                {"role": "user", "content": prompt.format(text=text)}
-            ],
-            "max_tokens": 200,
-            "temperature": 0.1
-        }
-        
-        response = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            return response.json()['content'][0]['text']
+
+# Large documents are summarized chunk by chunk (map), then the chunk summaries are
+# summarized into the usual 2-3 sentence answer (reduce)
+CHUNK_PROMPT = """Summarize this excerpt (part {index} of {count}) of a longer document in 2-3 sentences.
+Keep names, dates, amounts and obligations.
+
+Excerpt:
+{text}"""
+REDUCE_PROMPT = """Brief summary of the document (max 2-3 sentences)
+
+Please keep the response concise and focused.
+
+The document was too long to read at once. These are summaries of its consecutive parts:
+{summaries}"""
+
+TRUNCATION_NOTE = """
+
+Note: the document was too long to read in full; only its beginning is included above."""
+
+# Rough characters-per-token ratio for English prose; only used to size chunks
+CHARS_PER_TOKEN = 4
+# Upper bound on a single request's input, well inside the model's context window
+MAX_CHUNK_TOKENS = 150000
+
+class ClaudeAPIError(Exception):
+    """Raised when the Messages API answers with a non-200 status"""
+
+class CircuitOpenError(ClaudeAPIError):
+    """Raised without calling the API while the circuit breaker is open"""
+
+class ClaudeClient:
+    """Messages API client on a pooled keep-alive session.
+
+    Overloaded and transient failures (429, 529, 5xx, connection errors) are
+    retried with jittered exponential backoff, honoring retry-after. After
+    FAILURE_THRESHOLD calls in a row exhaust their retries the circuit opens and
+    calls fail fast for COOLDOWN seconds, then a single trial call is let through.
+    Any other response, 4xx included, shows the API is reachable and counts as
+    a success for the breaker.
+    """
+
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504, 529}
+    MAX_RETRIES = 4
+    BASE_BACKOFF = 1.0
+    MAX_BACKOFF = 30.0
+    FAILURE_THRESHOLD = 5
+    COOLDOWN = 30.0
+
+    def __init__(self, api_key, url, pool_size=10, timeout=30, metrics=None):
+        self.url = url
+        self.timeout = timeout
+        self.metrics = metrics
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json",
+        })
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def _before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.COOLDOWN:
+                raise CircuitOpenError("Claude API is unavailable, retrying shortly")
+            # Half-open: let this call through as the trial, keep others failing fast
+            self.opened_at = time.monotonic()
+
+    def _record(self, success):
+        with self.lock:
+            if success:
+                self.consecutive_failures = 0
+                self.opened_at = None
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.FAILURE_THRESHOLD:
+                    self.opened_at = time.monotonic()
+
+    def _count(self, name, amount=1):
+        if self.metrics is not None and amount:
+            self.metrics.increment(name, amount)
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.MAX_BACKOFF)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.MAX_BACKOFF, self.BASE_BACKOFF * 2 ** attempt))
+
+    def _post(self, payload, stream=False):
+        self._before_call()
+        for attempt in range(self.MAX_RETRIES + 1):
+            response = None
+            started = time.perf_counter()
+            self._count('claude_requests')
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = ClaudeAPIError(str(e))
+            else:
+                if self.metrics is not None:
+                    # For streams this is the time to the response headers
+                    self.metrics.observe('claude_api_request', time.perf_counter() - started)
+                if response.status_code == 200:
+                    self._record(True)
+                    return response
+                error = ClaudeAPIError(response.text)
+                if response.status_code not in self.RETRY_STATUSES:
+                    # A client error means the API is up: it closes a half-open
+                    # breaker and resets the failure count like a success
+                    self._record(True)
+                    raise error
+            if attempt < self.MAX_RETRIES:
+                self._count('claude_retries')
+                time.sleep(self._backoff(attempt, response))
+        self._record(False)
+        self._count('claude_failures')
+        raise error
+
+    def create_message(self, payload):
+        """POST a Messages API request and return the decoded JSON body"""
+        body = self._post(payload).json()
+        usage = body.get('usage') or {}
+        self._count('claude_input_tokens', usage.get('input_tokens', 0))
+        self._count('claude_output_tokens', usage.get('output_tokens', 0))
+        return body
+
+    def stream_message(self, payload):
+        """POST a streaming Messages API request and yield text deltas as they arrive.
+
+        Retries only cover getting the stream started; an error event in the
+        middle of the stream is raised as ClaudeAPIError.
+        """
+        response = self._post(dict(payload, stream=True), stream=True)
+        response.encoding = 'utf-8'
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event['type'] == 'content_block_delta':
+                    yield event['delta'].get('text', '')
+                elif event['type'] == 'message_start':
+                    usage = event['message'].get('usage') or {}
+                    self._count('claude_input_tokens', usage.get('input_tokens', 0))
+                elif event['type'] == 'message_delta':
+                    # Output tokens arrive as one cumulative count at the end
+                    self._count('claude_output_tokens', (event.get('usage') or {}).get('output_tokens', 0))
+                elif event['type'] == 'error':
+                    raise ClaudeAPIError(event['error'].get('message', 'Stream error'))
+                elif event['type'] == 'message_stop':
+                    return
+
+@st.cache_resource
+def get_claude_client():
+    """Process-wide Claude client, so every session reuses the same connection pool"""
+    return ClaudeClient(
+        st.secrets["CLAUDE_API_KEY"],
+        get_setting("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages"),
+        pool_size=max(10, int(get_setting("ANALYSIS_CONCURRENCY", 4))),
+        metrics=get_metrics()
+    )
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def split_into_chunks(text, chunk_tokens, overlap_tokens=0):
+    """Split text into overlapping chunks of about chunk_tokens, breaking on whitespace"""
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    if len(text) <= chunk_chars:
+        return [text]
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, chunk_chars // 2)
+    
+    chunks = []
+    start = 0
+    while True:
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            # Prefer a line or word break in the last tenth of the chunk
+            floor = start + chunk_chars * 9 // 10
+            split = max(text.rfind('\n', floor, end), text.rfind(' ', floor, end))
+            if split > start:
+                end = split
+        chunks.append(text[start:end])
+        if end == len(text):
+            return chunks
+        start = end - overlap_chars
+
+def chunk_document(text):
+    """Chunk text per the ANALYSIS_CHUNK_* settings, growing chunks to stay within ANALYSIS_MAX_CHUNKS.
+
+    Returns (chunks, truncated). Only text that max_chunks chunks of
+    MAX_CHUNK_TOKENS cannot hold is dropped, to keep cost bounded.
+    """
+    chunk_tokens = int(get_setting("ANALYSIS_CHUNK_TOKENS", 8000))
+    overlap_tokens = int(get_setting("ANALYSIS_CHUNK_OVERLAP", 200))
+    max_chunks = int(get_setting("ANALYSIS_MAX_CHUNKS", 16))
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    
+    # split_into_chunks breaks no earlier than 9/10 into a chunk, so each chunk
+    # advances at least chunk_chars * 9 // 10 - overlap_chars; size chunks so
+    # max_chunks of them always reach the end of the text
+    steps = max_chunks - 1
+    needed_chars = -(-(10 * len(text) + steps * (10 * overlap_chars + 9)) // (9 * steps + 10))
+    chunk_tokens = min(MAX_CHUNK_TOKENS, max(chunk_tokens, math.ceil(needed_chars / CHARS_PER_TOKEN)))
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    capacity = chunk_chars + steps * (chunk_chars * 9 // 10 - min(overlap_chars, chunk_chars // 2))
+    truncated = len(text) > capacity
+    if truncated:
+        logging.warning("Analyzing only the first %d of %d characters of a document", capacity, len(text))
+        text = text[:capacity]
+    return split_into_chunks(text, chunk_tokens, overlap_tokens), truncated
+
+def analysis_payload(content, max_tokens=200):
+    return {
+        "model": CLAUDE_MODEL,
+        "messages": [
+            {"role": "user", "content": content}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.1
+    }
+
+@st.cache_resource
+def get_chunk_executor():
+    """Process-wide pool for chunk summaries of single-document analyses"""
+    return ThreadPoolExecutor(max_workers=int(get_setting("ANALYSIS_CONCURRENCY", 4)),
+                              thread_name_prefix="analysis-chunk")
+
+def build_analysis_prompt(text, client, limiter, executor=None):
+    """Return the final summary prompt for text.
+
+    Text that fits in one chunk is sent as is. Larger text is split into chunks
+    that are summarized on executor (one after another without one), and the
+    prompt asks for a summary of those. Batch workers pass no executor, so a
+    batch never has more than ANALYSIS_CONCURRENCY requests in flight.
+    """
+    chunks, truncated = chunk_document(text)
+    note = TRUNCATION_NOTE if truncated else ""
+    if len(chunks) == 1:
+        return ANALYSIS_PROMPT.format(text=chunks[0]) + note
+    
+    def summarize(index, chunk):
+        limiter.acquire()
+        prompt = CHUNK_PROMPT.format(index=index + 1, count=len(chunks), text=chunk)
+        return client.create_message(analysis_payload(prompt, max_tokens=300))['content'][0]['text']
+    
+    summaries = list((executor.map if executor else map)(summarize, range(len(chunks)), chunks))
+    return REDUCE_PROMPT.format(summaries="\n\n".join(
+        f"Part {index + 1}: {summary}" for index, summary in enumerate(summaries)
+    )) + note
+
+def request_analysis(text, client=None, limiter=None, executor=None):
+    """Call the Claude Messages API and return the summary text.
+
+    Raises instead of reporting through st, so it is safe to call from worker
+    threads; pass the client and limiter in from the script thread in that case.
+    """
+    client = client or get_claude_client()
+    limiter = limiter or get_analysis_rate_limiter()
+    prompt = build_analysis_prompt(text, client, limiter, executor)
+    limiter.acquire()
+    return client.create_message(analysis_payload(prompt))['content'][0]['text']
+
+def stream_analysis(text, client=None, limiter=None, executor=None):
+    """Yield the summary text for a document as the API streams it"""
+    client = client or get_claude_client()
+    limiter = limiter or get_analysis_rate_limiter()
+    prompt = build_analysis_prompt(text, client, limiter, executor)
+    limiter.acquire()
+    yield from client.stream_message(analysis_payload(prompt))
+
+class AnalysisCache:
+    """Analyses keyed by content hash, model and prompt version.
+
+    Lookups go to an in-memory LRU first and then to a directory of text files
+    that is trimmed, oldest access first, once it grows past max_bytes.
+    """
+
+    def __init__(self, directory, max_entries=1024, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def key_for(text):
+        digest = hashlib.sha256(f"{CLAUDE_MODEL}\0{PROMPT_VERSION}\0".encode())
+        digest.update(text.encode('utf-8', errors='surrogatepass'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            path = self._path(key)
+            try:
+                with open(path, encoding='utf-8') as f:
+                    value = f.read()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self._remember(key, value)
+            path = self._path(key)
+            if not os.path.exists(path):
+                # Written aside and renamed into place, so readers in other
+                # processes never see a partial file
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.directory,
+                                                 suffix='.tmp', delete=False) as tmp:
+                    tmp.write(value)
+                os.replace(tmp.name, path)
+                self.disk_bytes += len(value.encode('utf-8'))
+                self._evict_disk()
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _disk_entries(self):
+        """(path, size, mtime) of the cached analyses; files other processes just removed are skipped"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.txt'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        if self.disk_bytes <= self.max_bytes:
+            return
+        # Other processes write and evict in the same directory, so recount from disk
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        self.disk_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.disk_bytes <= self.max_bytes:
+                break
+            self.disk_bytes -= size
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'disk_bytes': self.disk_bytes
+            }
+
+@st.cache_resource
+def get_analysis_cache():
+    """Process-wide analysis cache shared by every session"""
+    return AnalysisCache(
+        get_setting("ANALYSIS_CACHE_DIR", "analysis_cache"),
+        max_entries=int(get_setting("ANALYSIS_CACHE_ENTRIES", 1024)),
+        max_bytes=int(get_setting("ANALYSIS_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+    )
+
+def prometheus_metrics():
+    """Everything the Performance tab shows, as Prometheus text"""
+    cache_stats = get_analysis_cache().stats()
+    lines = [get_metrics().to_prometheus().rstrip("\n")]
+    for name in ('hits', 'misses'):
+        lines.append(f"# TYPE {Metrics.PREFIX}_analysis_cache_{name}_total counter")
+        lines.append(f"{Metrics.PREFIX}_analysis_cache_{name}_total {cache_stats[name]}")
+    lines.append(f"# TYPE {Metrics.PREFIX}_analysis_cache_disk_bytes gauge")
+    lines.append(f"{Metrics.PREFIX}_analysis_cache_disk_bytes {cache_stats['disk_bytes']}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_metrics().encode()
+        self.send_response(200)
+        self.send_header("content-type", "text/plain; version=0.0.4")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@st.cache_resource
+def get_metrics_server():
+    """Serve /metrics for Prometheus to scrape, if METRICS_PORT is set"""
+    port = get_setting("METRICS_PORT")
+    if not port:
+        return None
+    server = ThreadingHTTPServer((get_setting("METRICS_HOST", "127.0.0.1"), int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+@instrumented("analyze_with_claude")
+def analyze_with_claude(text):
+    cache = get_analysis_cache()
+    key = cache.key_for(text)
+    analysis = cache.get(key)
+    if analysis is not None:
+        return analysis
+    
+    try:
+        if get_setting("ANALYSIS_STREAMING", True):
+            # Render partial text in place as it arrives; write_stream returns the full text
+            analysis = st.write_stream(stream_analysis(text, executor=get_chunk_executor())) or None
         else:
-            st.error(f"API Error: {response.text}")
-            return None
+            analysis = request_analysis(text, executor=get_chunk_executor())
+    except ClaudeAPIError as e:
+        st.error(f"API Error: {str(e)}")
+        return None
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return None
+    if analysis:
+        cache.put(key, analysis)
+    return analysis
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+@st.cache_resource
+def get_analysis_rate_limiter():
+    """Process-wide limiter for Claude requests, shared by every session"""
+    per_minute = float(get_setting("ANALYSIS_RATE_PER_MINUTE", 50))
+    return TokenBucket(rate=per_minute / 60, capacity=max(1, int(get_setting("ANALYSIS_CONCURRENCY", 4))))
+
+def analyze_documents_batch(docs, on_progress=None):
+    """Analyze documents concurrently on a bounded thread pool.
+
+    Returns {doc_id: analysis} for the successes and {doc_id: error message} for
+    the failures. on_progress(doc, error) is called on the calling thread as each
+    document finishes.
+    """
+    limiter = get_analysis_rate_limiter()
+    cache = get_analysis_cache()
+    client = get_claude_client()
+    blobs = get_blob_store()
+    pool = get_extraction_pool()
+    concurrency = int(get_setting("ANALYSIS_CONCURRENCY", 4))
+
+    def run(doc):
+        # Text is loaded inside the worker, so at most `concurrency` documents are in memory
+        text = extract_text_content(doc, blobs, pool)
+        key = cache.key_for(text)
+        analysis = cache.get(key)
+        if analysis is None:
+            # Only cache misses spend a rate-limiter token
+            analysis = request_analysis(text, client, limiter)
+            cache.put(key, analysis)
+        return analysis
+
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(run, doc): doc for doc in docs}
+        for future in as_completed(futures):
+            doc = futures[future]
+            try:
+                results[doc['id']] = future.result()
+            except Exception as e:
+                errors[doc['id']] = str(e)
+            if on_progress:
+                on_progress(doc, errors.get(doc['id']))
+    return results, errors
 
 def login_user(email, password):
     if email in st.session_state['users']:
@@ -146,22 +2038,291 @@ def login_user(email, password):
     return False
 
 def log_user_action(action, details):
-    st.session_state['user_actions'].append({
-        'timestamp': datetime.now(),
-        'action': action,
-        'details': details,
-        'user': st.session_state['current_user']['email']
-    })
+    get_audit_log().log(datetime.now(), action, details, st.session_state['current_user']['email'])
+
+class ExpirationScheduler(threading.Thread):
+    """Background thread that removes documents once their retention period ends.
+
+    Pending removals sit in a min-heap of (expires_at, doc_id), so each wake-up
+    pops only the k due entries in O(k log n). Stale entries left behind when a
+    document is rescheduled are harmless: the delete re-checks expires_at in the
+    database. The heap is reloaded every RESYNC_INTERVAL to pick up removals
+    scheduled by other processes. Blobs left without a document are deleted
+    from the blob store along with their extracted text; one still inside the
+    blob store's GRACE period is retried on later wake-ups (or, after a
+    restart, stays on disk).
+    """
+
+    RESYNC_INTERVAL = timedelta(minutes=5)
+    ERROR_BACKOFF = 30
+
+    def __init__(self, store, retention_days, blobs=None, max_sleep=60):
+        super().__init__(name="expiration-scheduler", daemon=True)
+        self.store = store
+        self.blobs = blobs
+        self.orphaned_blobs = set()
+        self.retention_days = retention_days
+        self.max_sleep = max_sleep
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.heap = []
+        self._load()
+
+    def _load(self):
+        with self.lock:
+            self.heap = self.store.list_expirations()
+            heapq.heapify(self.heap)
+            self.loaded_at = datetime.now()
+
+    def schedule(self, doc_id, expires_at):
+        self.schedule_all([doc_id], expires_at)
+
+    def schedule_all(self, doc_ids, expires_at):
+        self.store.schedule_removals(doc_ids, expires_at)
+        if expires_at is None:
+            return
+        with self.lock:
+            for doc_id in doc_ids:
+                heapq.heappush(self.heap, (expires_at, doc_id))
+        self.wake.set()
+
+    def apply_retention_policy(self, doc_id, status, since):
+        """Schedule removal per RETENTION_DAYS for a document that just entered status"""
+        self.apply_retention_policies([doc_id], status, since)
+
+    def apply_retention_policies(self, doc_ids, status, since):
+        """apply_retention_policy for documents that entered status together"""
+        days = self.retention_days.get(status)
+        self.schedule_all(doc_ids, since + timedelta(days=float(days)) if days is not None else None)
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def pop_expired(self, now):
+        """Heap entries (expires_at, doc_id) that are due at now"""
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due.append(heapq.heappop(self.heap))
+        return due
+
+    def _remove_due(self, now):
+        if now - self.loaded_at > self.RESYNC_INTERVAL:
+            self._load()
+        due = self.pop_expired(now)
+        if due:
+            try:
+                self.orphaned_blobs.update(self.store.remove_documents([doc_id for _, doc_id in due], now))
+            except Exception:
+                # Put the batch back so the next attempt removes it
+                with self.lock:
+                    for entry in due:
+                        heapq.heappush(self.heap, entry)
+                raise
+        self._delete_orphaned_blobs()
+
+    def _delete_orphaned_blobs(self):
+        if self.blobs is None or not self.orphaned_blobs:
+            return
+        # Recheck, since a retried blob may have been uploaded again meanwhile
+        orphaned = set(self.store.unreferenced_hashes(self.orphaned_blobs))
+        self.orphaned_blobs = {content_hash for content_hash in orphaned
+                               if not self.blobs.delete(content_hash)}
 
-def check_expired_items():
-    current_time = datetime.now()
-    for doc_id, expiration_time in list(st.session_state['document_removal_times'].items()):
-        if current_time > expiration_time:
-            st.session_state['documents'] = [doc for doc in st.session_state['documents'] if doc['id'] != doc_id]
-            del st.session_state['document_removal_times'][doc_id]
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self._remove_due(datetime.now())
+            except Exception:
+                logging.exception("Removing expired documents failed, retrying in %ds", self.ERROR_BACKOFF)
+                self.stopped.wait(self.ERROR_BACKOFF)
+                continue
+            with self.lock:
+                next_due = self.heap[0][0] if self.heap else None
+            timeout = self.max_sleep
+            if next_due is not None:
+                timeout = max(0, min(timeout, (next_due - datetime.now()).total_seconds()))
+            self.wake.wait(timeout)
+            self.wake.clear()
+
+class AuditLog(threading.Thread):
+    """Append-only audit trail of user actions in rotating JSONL files.
+
+    log() only appends to an in-memory buffer and to a ring of the most recent
+    entries. This thread writes the buffer out with a single append every
+    FLUSH_INTERVAL seconds (sooner once BATCH_SIZE entries are waiting) and
+    bumps the per-action and per-user counts in the store for the same batch.
+    Once audit.jsonl would grow past max_bytes it is renamed to audit.jsonl.1,
+    shifting older files up to `backups`, as logging's RotatingFileHandler does.
+    Rotation and appends happen under a file lock, so several server processes
+    can share one log directory.
+    """
+
+    FLUSH_INTERVAL = 2
+    BATCH_SIZE = 100
+    RECENT = 50
+    TAIL_BYTES = 64 * 1024
+
+    def __init__(self, store, directory, max_bytes=10 * 1024 * 1024, backups=5):
+        super().__init__(name="audit-log", daemon=True)
+        self.store = store
+        # Absolute, because the atexit flush may run after the working directory changed
+        self.path = os.path.abspath(os.path.join(directory, "audit.jsonl"))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.buffer = []
+        self.writing = []
+        os.makedirs(directory, exist_ok=True)
+        self.recent = deque(self._load_recent(), maxlen=self.RECENT)
+        atexit.register(self.flush)
+
+    def _load_recent(self):
+        """The newest entries on disk, so a restart doesn't empty Recent Activity"""
+        try:
+            with open(self.path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - self.TAIL_BYTES))
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+        if len(lines) > 1 and os.path.getsize(self.path) > self.TAIL_BYTES:
+            # The first line is probably cut off by the seek
+            lines = lines[1:]
+        entries = [json.loads(line) for line in lines[-self.RECENT:] if line.strip()]
+        return entries or self.store.recent_actions(self.RECENT)
+
+    def log(self, timestamp, action, details, user):
+        entry = {
+            'timestamp': timestamp.isoformat(sep=' ', timespec='seconds'),
+            'action': action,
+            'details': details,
+            'user': user
+        }
+        with self.lock:
+            self.buffer.append(entry)
+            self.recent.append(entry)
+            full = len(self.buffer) >= self.BATCH_SIZE
+        if full:
+            self.wake.set()
+
+    def recent_entries(self, limit=10):
+        """Up to limit of the newest entries, newest first"""
+        with self.lock:
+            entries = list(self.recent)[-limit:]
+        return [dict(entry, timestamp=datetime.fromisoformat(entry['timestamp']))
+                for entry in reversed(entries)]
+
+    def unwritten_entries(self):
+        """Entries not yet counted in the store, so readers need not force a flush"""
+        with self.lock:
+            return self.writing + self.buffer
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock shared with the other server processes writing this log"""
+        with open(f"{self.path}.lock", 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                batch, self.buffer = self.buffer, []
+                # Entries written earlier whose counting failed are counted again with this batch
+                self.writing = self.writing + batch
+                uncounted = list(self.writing)
+            if not uncounted:
+                return
+            if batch:
+                data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+                try:
+                    with self._file_lock():
+                        self._rotate(len(data.encode('utf-8')))
+                        with open(self.path, 'a', encoding='utf-8') as f:
+                            f.write(data)
+                except OSError as e:
+                    logging.warning("Writing %d audit entries failed, retrying: %s", len(batch), e)
+                    with self.lock:
+                        self.buffer[:0] = batch
+                        self.writing = self.writing[:len(self.writing) - len(batch)]
+                    return
+            # If this raises, the entries stay in writing and are counted on the next flush
+            self.store.count_actions(uncounted)
+            with self.lock:
+                self.writing = self.writing[len(uncounted):]
+
+    def _rotate(self, incoming):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backups == 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.FLUSH_INTERVAL)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Audit log flush failed")
+        self.flush()
+
+@st.cache_resource
+def get_audit_log():
+    """Start the process-wide audit log writer"""
+    audit_log = AuditLog(
+        get_store(),
+        get_setting("AUDIT_LOG_DIR", "audit_log"),
+        max_bytes=int(get_setting("AUDIT_LOG_MAX_BYTES", 10 * 1024 * 1024)),
+        backups=int(get_setting("AUDIT_LOG_BACKUPS", 5))
+    )
+    audit_log.start()
+    return audit_log
+
+@st.cache_resource
+def get_expiration_scheduler():
+    """Start the process-wide expiration scheduler.
+
+    RETENTION_DAYS maps a status to how many days a document in that status is
+    kept, e.g. {"Rejected": 30}; statuses not listed are kept indefinitely.
+    """
+    scheduler = ExpirationScheduler(get_store(), dict(get_setting("RETENTION_DAYS", {})), get_blob_store())
+    scheduler.start()
+    return scheduler
 
 def handle_document_upload(uploaded_file, user_email):
-    doc_id = f"SIGN{st.session_state['doc_id_counter']:03d}"
+    """Ingest an uploaded file once.
+
+    Returns (doc_id, created). If the user already has a document with the same
+    content, nothing is stored, emailed or logged and its existing ID is returned.
+    """
+    store = st.session_state['store']
+    content_hash, file_size = get_blob_store().put(uploaded_file)
+    existing = store.find_document_by_hash(user_email, content_hash)
+    if existing:
+        return existing['id'], False
+    
+    doc_id = store.next_doc_id()
     upload_time = datetime.now()
     
     # Create document data
@@ -171,25 +2332,31 @@ def handle_document_upload(uploaded_file, user_email):
         'status': 'Pending',
         'upload_time': upload_time,
         'file_type': uploaded_file.type,
-        'file_size': uploaded_file.size,
-        'content': extract_text_content(uploaded_file),
+        'file_size': file_size,
+        # Text stays in the blob store and is loaded only for analysis
+        'content': None,
         'analysis': None,
         'uploaded_by': user_email,
-        'show_analysis': False  # New field for toggle state
+        'content_hash': content_hash
     }
     
-    # Add to documents list
-    st.session_state['documents'].append(doc_data)
+    # Add to documents and history
+    try:
+        store.add_document(doc_data, {
+            'date': upload_time.strftime("%Y-%m-%d %H:%M:%S"),
+            'id': doc_id,
+            'name': uploaded_file.name,
+            'status': f"Pending {STATUS_EMOJIS['Pending']}",
+            'analysis': None,
+            'uploaded_by': user_email
+        })
+    except sqlite3.IntegrityError:
+        # Another session ingested the same content between the lookup and the insert
+        return store.find_document_by_hash(user_email, content_hash)['id'], False
     
-    # Add to history
-    st.session_state['history'].append({
-        'date': upload_time.strftime("%Y-%m-%d %H:%M:%S"),
-        'id': doc_id,
-        'name': uploaded_file.name,
-        'status': f"Pending {STATUS_EMOJIS['Pending']}",
-        'analysis': None,
-        'uploaded_by': user_email
-    })
+    # Extract text in the background so it is ready by the time someone analyzes it
+    start_text_extraction(doc_data)
+    get_expiration_scheduler().apply_retention_policy(doc_id, 'Pending', upload_time)
     
     # Send email notification if uploaded by a regular user
     if st.session_state['users'][user_email]['role'] != 'admin':
@@ -198,38 +2365,42 @@ def handle_document_upload(uploaded_file, user_email):
 A new document has been uploaded:
 
 Document Name: {uploaded_file.name}
-Uploaded By: {st.session_state['users'][user_email]['name']} ({user_email})
+Uploaded By: {get_user_directory().name(user_email)} ({user_email})
 Upload Time: {upload_time.strftime('%Y-%m-%d %H:%M:%S')}
 Document ID: {doc_id}
 
 Please review this document in the system.
 """
-        send_email_notification(subject, body)
+        send_email_notification(subject, body, 'upload')
     
     log_user_action('upload', f"Document uploaded by {user_email}: {uploaded_file.name}")
-    return doc_id
+    return doc_id, True
 
 def analyze_document(doc):
     """Analyze a single document and update its analysis"""
-    if doc['id'] in st.session_state['analyzed_docs']:
+    store = st.session_state['store']
+    if store.is_analyzed(doc['id']):
         return False
     
-    analysis = analyze_with_claude(doc['content'])
+    try:
+        text = extract_text_content(doc)
+    except NoTextError as e:
+        st.error(str(e))
+        return False
+    analysis = analyze_with_claude(text)
     if analysis:
-        # Update document with analysis
-        for stored_doc in st.session_state['documents']:
-            if stored_doc['id'] == doc['id']:
-                stored_doc['analysis'] = analysis
-                break
-        
-        # Update history
-        for hist_doc in st.session_state['history']:
-            if hist_doc['id'] == doc['id']:
-                hist_doc['analysis'] = analysis
-        
-        # Mark as analyzed
-        st.session_state['analyzed_docs'].add(doc['id'])
-        
+        record_analyses([doc], {doc['id']: analysis})
+        return True
+    return False
+
+def record_analyses(docs, analyses):
+    """Store analyses for docs in one write, then notify and log each of them"""
+    # Update documents and history with analysis
+    st.session_state['store'].set_analyses(analyses)
+    
+    for doc in docs:
+        if doc['id'] not in analyses:
+            continue
         # Send email notification for analysis completion
         if doc['uploaded_by'] != st.session_state['current_user']['email']:
             subject = f"Document Analysis Completed: {doc['name']}"
@@ -243,12 +2414,42 @@ Document ID: {doc['id']}
 
 Please check the analysis results in the system.
 """
-            send_email_notification(subject, body)
+            send_email_notification(subject, body, 'analyze')
         
         log_user_action('analyze', f"Analyzed document: {doc['name']}")
-        return True
-    return False
 
+def analyze_all_documents(docs):
+    """Analyze docs as a batch, showing per-document progress"""
+    docs = [doc for doc in docs if not st.session_state['store'].is_analyzed(doc['id'])]
+    if not docs:
+        return {}, {}
+    progress = st.progress(0.0, text=f"Analyzing {len(docs)} document(s)...")
+    done = []
+    
+    def on_progress(doc, error):
+        done.append(doc['id'])
+        status = "failed" if error else "done"
+        progress.progress(len(done) / len(docs), text=f"{doc['name']}: {status} ({len(done)}/{len(docs)})")
+    
+    analyses, errors = analyze_documents_batch(docs, on_progress)
+    if analyses:
+        record_analyses(docs, analyses)
+    return analyses, errors
+
+def show_analysis_results(analysis):
+    with st.container():
+        st.markdown("### Analysis Results")
+        sections = analysis.split('\n')
+        for section in sections:
+            if any(header in section for header in [
+                "KEY POINTS:", "NAMES:", "DOCUMENT TYPE:",
+                "DATES & NUMBERS:", "SUMMARY:"
+            ]):
+                st.markdown(f"**{section}**")
+            elif section.strip():
+                st.write(section)
+
+@st.fragment
 def show_document_card(doc):
     """Display a single document card with analysis toggle"""
     with st.container():
@@ -258,57 +2459,76 @@ def show_document_card(doc):
             st.write(f"📄 {doc['name']} | Status: {doc['status']} {STATUS_EMOJIS[doc['status']]}")
             st.caption(f"Uploaded: {doc['upload_time'].strftime('%Y-%m-%d %H:%M:%S')}")
             if st.session_state['current_user']['role'] == 'admin':
-                st.caption(f"Uploaded by: {st.session_state['users'][doc['uploaded_by']]['name']}")
+                st.caption(f"Uploaded by: {get_user_directory().name(doc['uploaded_by'])}")
         
         # Analysis section
         if doc.get('analysis'):
             # Toggle for analysis
             if st.button("🔍 Toggle Analysis", key=f"toggle_{doc['id']}"):
-                doc['show_analysis'] = not doc.get('show_analysis', False)
+                st.session_state['shown_analyses'] ^= {doc['id']}
             
             # Show analysis if toggled
-            if doc.get('show_analysis', False):
-                with st.container():
-                    st.markdown("### Analysis Results")
-                    sections = doc['analysis'].split('\n')
-                    for section in sections:
-                        if any(header in section for header in [
-                            "KEY POINTS:", "NAMES:", "DOCUMENT TYPE:",
-                            "DATES & NUMBERS:", "SUMMARY:"
-                        ]):
-                            st.markdown(f"**{section}**")
-                        elif section.strip():
-                            st.write(section)
+            if doc['id'] in st.session_state['shown_analyses']:
+                show_analysis_results(doc['analysis'])
         
         st.divider()
 
+@instrumented("show_upload_section")
 def show_upload_section():
     st.header("Upload Documents 📤")
     
     # File uploader
     uploaded_files = st.file_uploader("Choose files", type=None, accept_multiple_files=True)
     
-    if uploaded_files:
+    # The uploader keeps returning the same files on every rerun; only ingest new ones
+    new_files = [uploaded_file for uploaded_file in uploaded_files or []
+                 if uploaded_file.file_id not in st.session_state['ingested_files']]
+    if new_files:
+        created, duplicates = 0, []
         with st.spinner("Processing uploads..."):
-            for uploaded_file in uploaded_files:
-                doc_id = handle_document_upload(uploaded_file, st.session_state['current_user']['email'])
-                st.session_state['doc_id_counter'] += 1
+            for uploaded_file in new_files:
+                doc_id, is_new = handle_document_upload(uploaded_file, st.session_state['current_user']['email'])
+                st.session_state['ingested_files'].add(uploaded_file.file_id)
+                if is_new:
+                    created += 1
+                else:
+                    duplicates.append(f"{uploaded_file.name} ({doc_id})")
             
-        st.success(f"Successfully uploaded {len(uploaded_files)} document(s)!")
+        if created:
+            st.success(f"Successfully uploaded {created} document(s)!")
+        if duplicates:
+            st.info(f"Already uploaded, skipped: {', '.join(duplicates)}")
 
-    # Show unanalyzed documents
-    unanalyzed_docs = [doc for doc in st.session_state['documents'] 
-                      if doc['id'] not in st.session_state['analyzed_docs']]
+    # Show unanalyzed documents; regular users only see their own
+    store = st.session_state['store']
+    user_email = None
+    if st.session_state['current_user']['role'] != 'admin':
+        user_email = st.session_state['current_user']['email']
+    total = store.count_documents(uploaded_by=user_email, analyzed=False)
     
-    if unanalyzed_docs:
+    if total:
         st.subheader("Documents Available for Analysis")
         
-        for doc in unanalyzed_docs:
+        if total > 1 and st.button(f"🔍 Analyze all ({total})", key="analyze_all"):
+            analyses, errors = analyze_all_documents(store.list_documents(uploaded_by=user_email, analyzed=False))
+            if errors:
+                st.error(f"Analysis failed for {len(errors)} document(s): "
+                         + "; ".join(f"{doc_id}: {error}" for doc_id, error in errors.items()))
+            else:
+                st.success(f"Analyzed {len(analyses)} document(s)!")
+                st.rerun()
+        
+        # Only the current page is fetched and rendered
+        _, page_size, offset = show_pager(total, "upload_page", int(get_setting("UPLOAD_PAGE_SIZE", 25)))
+        for doc in store.list_documents(uploaded_by=user_email, analyzed=False, limit=page_size, offset=offset):
             col1, col2 = st.columns([4, 1])
             with col1:
                 st.write(f"📄 {doc['name']} ({doc['file_type'] or 'unknown type'}) - {doc['file_size']/1024:.1f} KB")
             with col2:
-                if st.button("🔍 Analyze", key=f"analyze_{doc['id']}"):
+                analyze_clicked = st.button("🔍 Analyze", key=f"analyze_{doc['id']}")
+            if analyze_clicked:
+                # Streamed analysis text renders under the document name
+                with col1:
                     with st.spinner(f"Analyzing {doc['name']}..."):
                         if analyze_document(doc):
                             st.success("Analysis completed!")
@@ -316,62 +2536,14 @@ def show_upload_section():
                         else:
                             st.error("Analysis failed.")
 
-def show_status_section():
-    st.header("Document Status 📋")
-    check_expired_items()
-    
-    # Filter options
-    col1, col2 = st.columns([2, 2])
-    with col1:
-        status_filter = st.selectbox("Filter by status", ["All", "Pending", "Authorized", "Rejected"])
-    with col2:
-        if st.session_state['current_user']['role'] == 'admin':
-            user_filter = st.selectbox(
-                "Filter by user",
-                ["All Users"] + [user['name'] for user in st.session_state['users'].values()]
-            )
-    
-    filtered_docs = st.session_state['documents']
-    if status_filter != "All":
-        filtered_docs = [doc for doc in filtered_docs if doc['status'] == status_filter]
-    
-    if st.session_state['current_user']['role'] == 'admin' and user_filter != "All Users":
-        user_email = [email for email, user in st.session_state['users'].items() 
-                     if user['name'] == user_filter][0]
-        filtered_docs = [doc for doc in filtered_docs if doc.get('uploaded_by') == user_email]
-    elif st.session_state['current_user']['role'] != 'admin':
-        # Regular users can only see their own documents
-        filtered_docs = [doc for doc in filtered_docs 
-                        if doc.get('uploaded_by') == st.session_state['current_user']['email']]
-    
-    if filtered_docs:
-        for doc in filtered_docs:
-            with st.container():
-                # Document header and main info
-                col1, col2, col3 = st.columns([3, 1, 1])
-                with col1:
-                    st.write(f"📄 {doc['name']} | Status: {doc['status']} {STATUS_EMOJIS[doc['status']]}")
-                    st.caption(f"Uploaded: {doc['upload_time'].strftime('%Y-%m-%d %H:%M:%S')}")
-                    if st.session_state['current_user']['role'] == 'admin':
-                        st.caption(f"Uploaded by: {st.session_state['users'][doc['uploaded_by']]['name']}")
-                
-                # Action buttons for pending documents
-                if doc['status'] == 'Pending' and st.session_state['current_user']['role'] == 'admin':
-                    with col2:
-                        if st.button(f"Accept", key=f"accept_{doc['id']}"):
-                            doc['status'] = "Authorized"
-                            action_time = datetime.now()
-                            
-                            # Update history
-                            for hist_doc in st.session_state['history']:
-                                if hist_doc['id'] == doc['id']:
-                                    hist_doc['status'] = f"Authorized {STATUS_EMOJIS['Authorized']}"
-                                    hist_doc['date'] = action_time.strftime("%Y-%m-%d %H:%M:%S")
-                            
-                            # Send email notification
-                            if doc['uploaded_by'] != st.session_state['current_user']['email']:
-                                subject = f"Document Approved: {doc['name']}"
-                                body = f"""
+def decision_email(docs, status, action_time):
+    """(subject, body) telling an uploader about the decision on their documents"""
+    verb = "approved" if status == "Authorized" else "rejected"
+    if len(docs) == 1:
+        doc = docs[0]
+        if status == "Authorized":
+            subject = f"Document Approved: {doc['name']}"
+            body = f"""
 Your document has been approved:
 
 Document Name: {doc['name']}
@@ -381,27 +2553,9 @@ Document ID: {doc['id']}
 
 You can check the status in the system.
 """
-                                send_email_notification(subject, body)
-                            
-                            st.session_state['action_times'].append((doc['upload_time'], action_time))
-                            log_user_action('authorize', f"Authorized document: {doc['name']}")
-                            st.rerun()
-                    
-                    with col3:
-                        if st.button(f"Reject", key=f"reject_{doc['id']}"):
-                            doc['status'] = "Rejected"
-                            action_time = datetime.now()
-                            
-                            # Update history
-                            for hist_doc in st.session_state['history']:
-                                if hist_doc['id'] == doc['id']:
-                                    hist_doc['status'] = f"Rejected {STATUS_EMOJIS['Rejected']}"
-                                    hist_doc['date'] = action_time.strftime("%Y-%m-%d %H:%M:%S")
-                            
-                            # Send email notification
-                            if doc['uploaded_by'] != st.session_state['current_user']['email']:
-                                subject = f"Document Rejected: {doc['name']}"
-                                body = f"""
+        else:
+            subject = f"Document Rejected: {doc['name']}"
+            body = f"""
 Your document has been rejected:
 
 Document Name: {doc['name']}
@@ -411,46 +2565,252 @@ Document ID: {doc['id']}
 
 Please check the status in the system for more information.
 """
-                                send_email_notification(subject, body)
-                            
-                            st.session_state['action_times'].append((doc['upload_time'], action_time))
-                            log_user_action('reject', f"Rejected document: {doc['name']}")
-                            st.rerun()
-                
-                # Analysis section with toggle
-                if doc.get('analysis'):
-                    if st.button("🔍 Toggle Analysis", key=f"toggle_status_{doc['id']}"):
-                        doc['show_analysis'] = not doc.get('show_analysis', False)
-                    
-                    if doc.get('show_analysis', False):
-                        with st.container():
-                            st.markdown("### Analysis Results")
-                            sections = doc['analysis'].split('\n')
-                            for section in sections:
-                                if any(header in section for header in [
-                                    "KEY POINTS:", "NAMES:", "DOCUMENT TYPE:",
-                                    "DATES & NUMBERS:", "SUMMARY:"
-                                ]):
-                                    st.markdown(f"**{section}**")
-                                elif section.strip():
-                                    st.write(section)
-                elif st.session_state['current_user']['role'] == 'admin':
-                    if st.button("🔍 Analyze", key=f"analyze_status_{doc['id']}"):
-                        with st.spinner("Analyzing document..."):
-                            if analyze_document(doc):
-                                st.success("Analysis completed!")
-                                st.rerun()
-                            else:
-                                st.error("Analysis failed.")
-                
-                st.divider()
-    else:
+        return subject, body
+    
+    lines = "\n".join(f"- {doc['name']} ({doc['id']})" for doc in docs)
+    subject = f"{len(docs)} Documents {verb.capitalize()}"
+    body = f"""
+{len(docs)} of your documents have been {verb}:
+
+{lines}
+
+{verb.capitalize()} By: {st.session_state['current_user']['name']}
+{"Approval" if status == "Authorized" else "Rejection"} Time: {action_time.strftime('%Y-%m-%d %H:%M:%S')}
+
+You can check the status in the system.
+"""
+    return subject, body
+
+def decide_documents(docs, status):
+    """Authorize or reject pending documents as one batch.
+
+    Statuses and history change in a single transaction, and each uploader
+    gets one email covering all of their documents. Returns the documents
+    that were decided; the rest had already been decided by another admin.
+    """
+    action_time = datetime.now()
+    store = st.session_state['store']
+    
+    # Update documents and history, skipping those another admin got to first
+    moved = set(store.set_statuses([doc['id'] for doc in docs], status, action_time))
+    decided = [doc for doc in docs if doc['id'] in moved]
+    if not decided:
+        return []
+    
+    # One email per uploader
+    by_uploader = defaultdict(list)
+    for doc in decided:
+        if doc['uploaded_by'] != st.session_state['current_user']['email']:
+            by_uploader[doc['uploaded_by']].append(doc)
+    for uploader_docs in by_uploader.values():
+        send_email_notification(*decision_email(uploader_docs, status, action_time),
+                                'authorize' if status == "Authorized" else 'reject')
+    
+    store.record_action_times([(doc['upload_time'], action_time) for doc in decided])
+    get_expiration_scheduler().apply_retention_policies([doc['id'] for doc in decided], status, action_time)
+    for doc in decided:
+        log_user_action('authorize' if status == "Authorized" else 'reject', f"{status} document: {doc['name']}")
+    return decided
+
+def decide_document(doc, status):
+    """Authorize or reject a pending document.
+
+    Returns False, changing nothing, if another admin already decided it.
+    """
+    return bool(decide_documents([doc], status))
+
+def refresh_card(doc_id):
+    """Rerun just the calling card, re-reading its document"""
+    st.session_state['changed_documents'].add(doc_id)
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # The card was drawn by a full run (e.g. the page's first render)
+        st.rerun()
+
+@st.fragment
+def show_status_card(doc):
+    """Display one document with its Accept/Reject/Analyze actions.
+
+    Runs as a fragment: an action reruns this card only, not the whole page.
+    """
+    # A fragment rerun replays the arguments of the last full run, so pick
+    # up changes made by this card since then
+    if doc['id'] in st.session_state['changed_documents']:
+        doc = st.session_state['store'].get_document(doc['id']) or doc
+    
+    with st.container():
+        # Document header and main info
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            st.write(f"📄 {doc['name']} | Status: {doc['status']} {STATUS_EMOJIS[doc['status']]}")
+            st.caption(f"Uploaded: {doc['upload_time'].strftime('%Y-%m-%d %H:%M:%S')}")
+            if st.session_state['current_user']['role'] == 'admin':
+                st.caption(f"Uploaded by: {get_user_directory().name(doc['uploaded_by'])}")
+        
+        # Action buttons for pending documents
+        if doc['status'] == 'Pending' and st.session_state['current_user']['role'] == 'admin':
+            with col2:
+                if st.button(f"Accept", key=f"accept_{doc['id']}"):
+                    if decide_document(doc, "Authorized"):
+                        refresh_card(doc['id'])
+                    else:
+                        st.warning(f"{doc['name']} was already processed by another administrator.")
+            
+            with col3:
+                if st.button(f"Reject", key=f"reject_{doc['id']}"):
+                    if decide_document(doc, "Rejected"):
+                        refresh_card(doc['id'])
+                    else:
+                        st.warning(f"{doc['name']} was already processed by another administrator.")
+        
+        # Analysis section with toggle
+        if doc.get('analysis'):
+            if st.button("🔍 Toggle Analysis", key=f"toggle_status_{doc['id']}"):
+                st.session_state['shown_analyses'] ^= {doc['id']}
+            
+            if doc['id'] in st.session_state['shown_analyses']:
+                show_analysis_results(doc['analysis'])
+        elif st.session_state['current_user']['role'] == 'admin':
+            if st.button("🔍 Analyze", key=f"analyze_status_{doc['id']}"):
+                with st.spinner("Analyzing document..."):
+                    if analyze_document(doc):
+                        refresh_card(doc['id'])
+                    else:
+                        st.error("Analysis failed.")
+        
+        st.divider()
+
+@st.fragment
+def show_status_table(docs, table_key):
+    """Display a page of documents as one table; selected rows drive the actions.
+
+    Runs as a fragment, so changing the selection does not rerun the page.
+    """
+    table = pd.DataFrame({
+        'ID': [doc['id'] for doc in docs],
+        'Name': [doc['name'] for doc in docs],
+        'Status': [f"{doc['status']} {STATUS_EMOJIS[doc['status']]}" for doc in docs],
+        'Uploaded': [doc['upload_time'] for doc in docs],
+        'Uploaded By': get_user_directory().map_names(pd.Series([doc['uploaded_by'] for doc in docs], dtype=object)),
+        'Analyzed': [doc['analysis'] is not None for doc in docs],
+    })
+    event = st.dataframe(
+        table,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"{table_key}_{st.session_state['status_table_version']}",
+        column_config={
+            "Uploaded": st.column_config.DatetimeColumn("Uploaded", format="D MMM YYYY, HH:mm")
+        }
+    )
+    selected = [docs[row] for row in event.selection.rows]
+    if not selected:
+        st.caption("Select rows to act on them or to read their analysis.")
+        return
+    
+    if st.session_state['current_user']['role'] == 'admin':
+        pending = [doc for doc in selected if doc['status'] == 'Pending']
+        unanalyzed = [doc for doc in selected if not doc.get('analysis')]
+        col1, col2, col3 = st.columns(3)
+        decision = None
+        with col1:
+            if st.button(f"Accept ({len(pending)})", key="table_accept", disabled=not pending):
+                decision = "Authorized"
+        with col2:
+            if st.button(f"Reject ({len(pending)})", key="table_reject", disabled=not pending):
+                decision = "Rejected"
+        with col3:
+            if st.button(f"🔍 Analyze ({len(unanalyzed)})", key="table_analyze", disabled=not unanalyzed):
+                analyses, errors = analyze_all_documents(unanalyzed)
+                if errors:
+                    st.error(f"Analysis failed for {len(errors)} document(s).")
+                else:
+                    st.session_state['status_table_version'] += 1
+                    st.rerun()
+        if decision:
+            decided = {doc['id'] for doc in decide_documents(pending, decision)}
+            skipped = [doc['name'] for doc in pending if doc['id'] not in decided]
+            if skipped:
+                st.warning(f"Already processed by another administrator: {', '.join(skipped)}")
+            else:
+                # Start the next render with a clean selection
+                st.session_state['status_table_version'] += 1
+                st.rerun()
+    
+    for doc in selected:
+        if doc.get('analysis'):
+            with st.expander(f"🔍 {doc['name']}"):
+                show_analysis_results(doc['analysis'])
+
+def show_pager(total, key, default_size):
+    """Page size and page number controls for total items; returns (page, page_size, offset)"""
+    page_sizes = [10, 25, 50, 100]
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox(
+            "Per page", page_sizes,
+            index=page_sizes.index(default_size) if default_size in page_sizes else 1,
+            key=f"{key}_size"
+        )
+    pages = math.ceil(total / page_size)
+    if st.session_state.get(key, 1) > pages:
+        st.session_state[key] = pages
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=key)
+    offset = (page - 1) * page_size
+    with col3:
+        st.caption(f"Showing {offset + 1}-{min(offset + page_size, total)} of {total} documents")
+    return page, page_size, offset
+
+@instrumented("show_status_section")
+def show_status_section():
+    st.header("Document Status 📋")
+    
+    # Filter options
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        status_filter = st.selectbox("Filter by status", ["All", "Pending", "Authorized", "Rejected"])
+    with col2:
+        if st.session_state['current_user']['role'] == 'admin':
+            user_filter = st.selectbox(
+                "Filter by user",
+                ["All Users"] + get_user_directory().names()
+            )
+    with col3:
+        view_mode = st.radio("View", ["Cards", "Table"], horizontal=True, key="status_view_mode")
+    
+    user_email = None
+    if st.session_state['current_user']['role'] == 'admin' and user_filter != "All Users":
+        user_email = get_user_directory().email_for(user_filter)
+    elif st.session_state['current_user']['role'] != 'admin':
+        # Regular users can only see their own documents
+        user_email = st.session_state['current_user']['email']
+    status = None if status_filter == "All" else status_filter
+    
+    # Only the current page is fetched and rendered
+    store = st.session_state['store']
+    total = store.count_documents(status=status, uploaded_by=user_email)
+    if not total:
         st.info("No documents found matching the selected filter")
+        return
+    
+    page, page_size, offset = show_pager(total, "status_page", int(get_setting("STATUS_PAGE_SIZE", 25)))
+    docs = store.list_documents(status=status, uploaded_by=user_email, limit=page_size, offset=offset)
+    if view_mode == "Table":
+        show_status_table(docs, f"status_table_{status_filter}_{user_email}_{page}_{page_size}")
+    else:
+        for doc in docs:
+            show_status_card(doc)
 
+@instrumented("show_history_section")
 def show_history_section():
     st.header("Document History 📚")
     
-    if st.session_state['history']:
+    store = st.session_state['store']
+    if store.has_history():
         # Add date range filter
         col1, col2, col3 = st.columns([2, 2, 2])
         with col1:
@@ -461,30 +2821,24 @@ def show_history_section():
             if st.session_state['current_user']['role'] == 'admin':
                 user_filter = st.selectbox(
                     "Filter by user",
-                    ["All Users"] + [user['name'] for user in st.session_state['users'].values()]
+                    ["All Users"] + get_user_directory().names()
                 )
         
-        # Convert history to DataFrame
-        history_df = pd.DataFrame(st.session_state['history'])
-        history_df['date'] = pd.to_datetime(history_df['date'])
-        
-        # Apply filters
-        mask = (history_df['date'].dt.date >= start_date) & (history_df['date'].dt.date <= end_date)
-        filtered_df = history_df[mask]
-        
+        user_email = None
         if st.session_state['current_user']['role'] == 'admin' and user_filter != "All Users":
-            user_email = [email for email, user in st.session_state['users'].items() 
-                         if user['name'] == user_filter][0]
-            filtered_df = filtered_df[filtered_df['uploaded_by'] == user_email]
+            user_email = get_user_directory().email_for(user_filter)
         elif st.session_state['current_user']['role'] != 'admin':
             # Regular users can only see their own history
-            filtered_df = filtered_df[filtered_df['uploaded_by'] == st.session_state['current_user']['email']]
+            user_email = st.session_state['current_user']['email']
+        
+        # Only the day partitions inside the selected range are read
+        filtered_df = get_history_archive().read(start_date, end_date)
+        if user_email is not None:
+            filtered_df = filtered_df[filtered_df['uploaded_by'] == user_email]
         
         if not filtered_df.empty:
-            # Add user names to the display
-            filtered_df['uploaded_by'] = filtered_df['uploaded_by'].apply(
-                lambda x: st.session_state['users'][x]['name']
-            )
+            # Add user names and status emojis to the display
+            filtered_df = present_history(filtered_df)
             
             # Display history table
             st.dataframe(
@@ -502,23 +2856,305 @@ def show_history_section():
                 }
             )
             
-            # Export options
-            col1, col2 = st.columns([1, 4])
+            # Export options; the file is streamed from the archive and cached per filter
+            col1, col2, col3 = st.columns([1, 1, 3])
+            with col1:
+                export_format = st.selectbox("Export format", ["CSV", "JSON", "Parquet"])
+            with col2:
+                compress = st.checkbox("gzip", disabled=export_format == "Parquet")
             with col1:
                 if st.button("Export History"):
-                    csv = filtered_df.to_csv(index=False)
-                    st.download_button(
-                        "📥 Download CSV",
-                        csv,
-                        "document_history.csv",
-                        "text/csv",
-                        key='download-csv'
-                    )
+                    fmt = export_format.lower()
+                    with st.spinner("Preparing export..."):
+                        path = get_history_exporter().export(start_date, end_date, user_email, fmt, compress)
+                    with open(path, 'rb') as f:
+                        st.download_button(
+                            f"📥 Download {export_format}",
+                            f,
+                            f"document_history.{fmt}" + (".gz" if path.endswith(".gz") else ""),
+                            "application/gzip" if path.endswith(".gz") else HistoryExporter.FORMATS[fmt],
+                            key=f'download-{fmt}'
+                        )
         else:
             st.info("No documents found in selected date range")
     else:
         st.info("No document history available")
 
+@st.fragment
+def show_overview_tab():
+    store = st.session_state['store']
+    st.header("System Overview")
+    
+    # Summary metrics
+    col1, col2, col3 = st.columns(3)
+    
+    summary = store.analytics_summary()
+    with col1:
+        st.metric("Total Documents", summary['documents'])
+        pending = summary['status'].get('Pending', 0)
+        st.metric("Pending Documents", pending)
+    
+    with col2:
+        analyzed = summary['analyzed']
+        st.metric("Analyzed Documents", analyzed)
+        st.metric("Active Users", len(summary['users']))
+    
+    with col3:
+        approved = summary['status'].get('Authorized', 0)
+        if summary['documents'] > 0:
+            approval_rate = (approved / summary['documents']) * 100
+            st.metric("Approval Rate", f"{approval_rate:.1f}%")
+        
+        today_docs = sum(row['count'] for row in store.daily_analytics(datetime.now().date()))
+        st.metric("Today's Documents", today_docs)
+    
+    # Status Distribution
+    st.subheader("Document Status Distribution")
+    status_counts = pd.Series(summary['status'], name='count').sort_values(ascending=False)
+    st.bar_chart(status_counts)
+
+@st.fragment
+def show_user_activity_tab():
+    store = st.session_state['store']
+    st.header("User Activity")
+    
+    audit_log = get_audit_log()
+    # Entries the writer hasn't counted yet are added from memory rather than flushed here
+    pending = audit_log.unwritten_entries()
+    counts = store.action_counts()
+    for entry in pending:
+        counts['action'][entry['action']] = counts['action'].get(entry['action'], 0) + 1
+        counts['user'][entry['user']] = counts['user'].get(entry['user'], 0) + 1
+    if counts['action']:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("Activity by User")
+            user_activity = pd.Series(counts['user'])
+            user_activity.index = get_user_directory().map_names(user_activity.index.to_series())
+            st.bar_chart(user_activity.groupby(level=0).sum().sort_values(ascending=False))
+        
+        with col2:
+            st.subheader("Actions Distribution")
+            action_counts = pd.Series(counts['action']).sort_values(ascending=False)
+            st.bar_chart(action_counts)
+        
+        # Recent Activity Timeline
+        st.subheader("Recent Activity")
+        for action in audit_log.recent_entries(10):
+            st.text(f"""
+🕒 {action['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
+👤 {get_user_directory().name(action['user'])}
+📋 {action['action'].title()}: {action['details']}
+""")
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f} seconds"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} minutes"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} hours"
+    return f"{seconds / 86400:.1f} days"
+
+@st.fragment
+def show_performance_tab():
+    store = st.session_state['store']
+    st.header("System Performance")
+    
+    # Sketches are summed from bounded per-slot buckets, so this is constant-time in volume
+    now = datetime.now()
+    sketches = {
+        "Last hour": store.processing_time_sketch(now - timedelta(hours=1)),
+        "Last day": store.processing_time_sketch(now - timedelta(days=1)),
+        "Last week": store.processing_time_sketch(now - timedelta(weeks=1)),
+        "All time": store.processing_time_sketch(),
+    }
+    overall = sketches["All time"]
+    if overall.count:
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.metric("Average Processing Time", format_duration(overall.mean()))
+            st.metric("Fastest Processing", format_duration(overall.quantile(0)))
+            st.metric("Slowest Processing", format_duration(overall.quantile(1)))
+        
+        with col2:
+            st.subheader("Processing Time Percentiles")
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        'Window': window,
+                        'Decisions': sketch.count,
+                        'p50': format_duration(sketch.quantile(0.50)),
+                        'p95': format_duration(sketch.quantile(0.95)),
+                        'p99': format_duration(sketch.quantile(0.99)),
+                    }
+                    for window, sketch in sketches.items() if sketch.count
+                ]),
+                hide_index=True,
+                use_container_width=True
+            )
+        
+        st.subheader("Processing Time Distribution")
+        shares = overall.cumulative_shares()
+        st.line_chart(
+            pd.DataFrame({
+                'hours': [seconds / 3600 for seconds, _ in shares],
+                'decided within (%)': [share * 100 for _, share in shares],
+            }),
+            x='hours',
+            y='decided within (%)'
+        )
+    
+    st.subheader("Analysis Cache")
+    cache_stats = get_analysis_cache().stats()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Cache Hit Rate", f"{cache_stats['hit_rate'] * 100:.1f}%")
+    with col2:
+        st.metric("Hits / Misses", f"{cache_stats['hits']} / {cache_stats['misses']}")
+    with col3:
+        st.metric("Disk Cache Size", f"{cache_stats['disk_bytes'] / 1024:.1f} KB")
+    
+    # Latency of the app's own hot paths, since this process started
+    st.subheader("Call Latency")
+    latencies, counters = get_metrics().summary()
+    if latencies:
+        st.dataframe(
+            pd.DataFrame(latencies).set_index('name'),
+            use_container_width=True,
+            column_config={
+                column: st.column_config.NumberColumn(column.replace('_ms', ' (ms)'), format="%.1f")
+                for column in ['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+            }
+        )
+    else:
+        st.info("No calls recorded since the server started.")
+    
+    st.subheader("Claude API")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Requests", counters.get('claude_requests', 0))
+    with col2:
+        st.metric("Retries / Failures", f"{counters.get('claude_retries', 0)} / {counters.get('claude_failures', 0)}")
+    with col3:
+        st.metric("Input Tokens", f"{counters.get('claude_input_tokens', 0):,}")
+    with col4:
+        st.metric("Output Tokens", f"{counters.get('claude_output_tokens', 0):,}")
+    
+    st.download_button(
+        "📥 Prometheus metrics",
+        prometheus_metrics(),
+        "metrics.prom",
+        "text/plain"
+    )
+
+@st.fragment
+def show_trends_tab():
+    store = st.session_state['store']
+    st.header("Trend Analysis")
+    
+    # One row per (day, status, user) with a count, so this is O(days), not O(history)
+    df_daily = pd.DataFrame(store.daily_analytics())
+    df_daily['day'] = pd.to_datetime(df_daily['day']).dt.date
+    
+    # Daily volume trend
+    st.subheader("Document Volume Trend")
+    daily_volume = df_daily.groupby('day')['count'].sum()
+    st.line_chart(daily_volume)
+    
+    # Status trends
+    st.subheader("Status Trends")
+    status_by_date = df_daily.pivot_table(
+        index='day', columns='status', values='count', aggfunc='sum', fill_value=0
+    )
+    st.line_chart(status_by_date)
+    
+    # User trends
+    st.subheader("User Activity Trends")
+    df_daily['user_name'] = get_user_directory().map_names(df_daily['uploaded_by'])
+    user_by_date = df_daily.pivot_table(
+        index='day', columns='user_name', values='count', aggfunc='sum', fill_value=0
+    )
+    st.line_chart(user_by_date)
+
+@st.fragment
+def show_reports_tab():
+    st.header("Custom Reports")
+    
+    # Report parameters
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        report_start = st.date_input("Start Date", value=datetime.now() - timedelta(days=30))
+    with col2:
+        report_end = st.date_input("End Date", value=datetime.now())
+    with col3:
+        selected_user = st.selectbox(
+            "Select User",
+            ["All Users"] + get_user_directory().names()
+        )
+    
+    # Report metrics selection
+    metrics = st.multiselect(
+        "Select Metrics to Include",
+        ["Document Statistics", "User Activity", "Processing Times", "Status Distribution"],
+        default=["Document Statistics"]
+    )
+    
+    if st.button("Generate Report"):
+        report_data = {
+            "Report Period": f"{report_start} to {report_end}",
+            "Generated At": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Generated By": st.session_state['current_user']['name'],
+            "Metrics": {}
+        }
+        
+        user_email = None
+        if selected_user != "All Users":
+            user_email = get_user_directory().email_for(selected_user)
+        
+        # Counted a batch at a time, so the range is never loaded whole
+        total = analyzed = 0
+        status_counts = pd.Series(dtype='int64')
+        user_counts = pd.Series(dtype='int64')
+        for batch in get_history_archive().iter_batches(report_start, report_end, user_email):
+            total += len(batch)
+            analyzed += int(batch['analysis'].notna().sum())
+            status_counts = status_counts.add(batch['status'].astype(str).value_counts(), fill_value=0)
+            user_counts = user_counts.add(batch['uploaded_by'].astype(str).value_counts(), fill_value=0)
+        status_counts = status_counts.astype('int64').sort_values(ascending=False)
+        user_counts = user_counts.astype('int64').sort_values(ascending=False)
+        
+        if "Document Statistics" in metrics:
+            report_data["Metrics"]["Document Statistics"] = {
+                "Total Documents": total,
+                "Status Distribution": status_counts.to_dict(),
+                "Analysis Rate": f"{(analyzed / total * 100 if total else 0):.1f}%"
+            }
+        
+        if "User Activity" in metrics:
+            user_counts.index = get_user_directory().map_names(user_counts.index.to_series())
+            report_data["Metrics"]["User Activity"] = {
+                "Active Users": len(user_counts),
+                "Documents per User": user_counts.groupby(level=0, sort=False).sum().to_dict()
+            }
+        
+        # Display and download options
+        st.json(report_data)
+        
+        # Export options
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            if st.download_button(
+                "📥 Download Report",
+                data=json.dumps(report_data, indent=2),
+                file_name=f"analytics_report_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
+                mime="application/json"
+            ):
+                st.success("Report downloaded successfully!")
+
+@instrumented("show_enhanced_analytics")
 def show_enhanced_analytics():
     if st.session_state['current_user']['role'] != 'admin':
         st.warning("Analytics are only available for administrators.")
@@ -526,7 +3162,8 @@ def show_enhanced_analytics():
         
     st.title("Analytics Dashboard 📊")
     
-    if not st.session_state['history']:
+    store = st.session_state['store']
+    if not store.has_history():
         st.info("No data available for analytics yet.")
         return
     
@@ -540,186 +3177,19 @@ def show_enhanced_analytics():
     ])
     
     with tabs[0]:  # Overview
-        st.header("System Overview")
-        
-        # Summary metrics
-        col1, col2, col3 = st.columns(3)
-        
-        df_history = pd.DataFrame(st.session_state['history'])
-        with col1:
-            st.metric("Total Documents", len(df_history))
-            pending = len([d for d in st.session_state['documents'] if d['status'] == 'Pending'])
-            st.metric("Pending Documents", pending)
-        
-        with col2:
-            analyzed = len(st.session_state['analyzed_docs'])
-            st.metric("Analyzed Documents", analyzed)
-            st.metric("Active Users", len(df_history['uploaded_by'].unique()))
-        
-        with col3:
-            approved = len([d for d in st.session_state['documents'] if d['status'] == 'Authorized'])
-            if len(df_history) > 0:
-                approval_rate = (approved / len(df_history)) * 100
-                st.metric("Approval Rate", f"{approval_rate:.1f}%")
-            
-            today_docs = len(df_history[pd.to_datetime(df_history['date']).dt.date == datetime.now().date()])
-            st.metric("Today's Documents", today_docs)
-        
-        # Status Distribution
-        st.subheader("Document Status Distribution")
-        status_counts = df_history['status'].apply(lambda x: x.split()[0]).value_counts()
-        st.bar_chart(status_counts)
+        show_overview_tab()
     
     with tabs[1]:  # User Activity
-        st.header("User Activity")
-        
-        df_actions = pd.DataFrame(st.session_state['user_actions'])
-        if not df_actions.empty:
-            df_actions['timestamp'] = pd.to_datetime(df_actions['timestamp'])
-            df_actions['user_name'] = df_actions['user'].apply(
-                lambda x: st.session_state['users'][x]['name']
-            )
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("Activity by User")
-                user_activity = df_actions['user_name'].value_counts()
-                st.bar_chart(user_activity)
-            
-            with col2:
-                st.subheader("Actions Distribution")
-                action_counts = df_actions['action'].value_counts()
-                st.bar_chart(action_counts)
-            
-            # Recent Activity Timeline
-            st.subheader("Recent Activity")
-            recent = df_actions.sort_values('timestamp', ascending=False).head(10)
-            for _, action in recent.iterrows():
-                st.text(f"""
-🕒 {action['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-👤 {action['user_name']}
-📋 {action['action'].title()}: {action['details']}
-""")
+        show_user_activity_tab()
     
     with tabs[2]:  # Performance
-        st.header("System Performance")
-        
-        if st.session_state['action_times']:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                time_diffs = [(action - upload).total_seconds() 
-                             for upload, action in st.session_state['action_times']]
-                
-                avg_time = sum(time_diffs) / len(time_diffs)
-                max_time = max(time_diffs)
-                min_time = min(time_diffs)
-                
-                st.metric("Average Processing Time", f"{avg_time:.1f} seconds")
-                st.metric("Fastest Processing", f"{min_time:.1f} seconds")
-                st.metric("Slowest Processing", f"{max_time:.1f} seconds")
-            
-            with col2:
-                st.subheader("Processing Time Distribution")
-                time_df = pd.DataFrame(time_diffs, columns=['seconds'])
-                st.line_chart(time_df)
+        show_performance_tab()
     
     with tabs[3]:  # Trends
-        st.header("Trend Analysis")
-        
-        df_history['date'] = pd.to_datetime(df_history['date'])
-        
-        # Daily volume trend
-        st.subheader("Document Volume Trend")
-        daily_volume = df_history.groupby(df_history['date'].dt.date).size()
-        st.line_chart(daily_volume)
-        
-        # Status trends
-        st.subheader("Status Trends")
-        status_by_date = df_history.groupby([
-            df_history['date'].dt.date,
-            df_history['status'].apply(lambda x: x.split()[0])
-        ]).size().unstack(fill_value=0)
-        st.line_chart(status_by_date)
-        
-        # User trends
-        st.subheader("User Activity Trends")
-        user_by_date = df_history.groupby([
-            df_history['date'].dt.date,
-            df_history['uploaded_by'].apply(lambda x: st.session_state['users'][x]['name'])
-        ]).size().unstack(fill_value=0)
-        st.line_chart(user_by_date)
+        show_trends_tab()
     
     with tabs[4]:  # Reports
-        st.header("Custom Reports")
-        
-        # Report parameters
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            report_start = st.date_input("Start Date", value=datetime.now() - timedelta(days=30))
-        with col2:
-            report_end = st.date_input("End Date", value=datetime.now())
-        with col3:
-            selected_user = st.selectbox(
-                "Select User",
-                ["All Users"] + [user['name'] for user in st.session_state['users'].values()]
-            )
-        
-        # Report metrics selection
-        metrics = st.multiselect(
-            "Select Metrics to Include",
-            ["Document Statistics", "User Activity", "Processing Times", "Status Distribution"],
-            default=["Document Statistics"]
-        )
-        
-        if st.button("Generate Report"):
-            report_data = {
-                "Report Period": f"{report_start} to {report_end}",
-                "Generated At": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "Generated By": st.session_state['current_user']['name'],
-                "Metrics": {}
-            }
-            
-            filtered_history = df_history[
-                (df_history['date'].dt.date >= report_start) & 
-                (df_history['date'].dt.date <= report_end)
-            ]
-            
-            if selected_user != "All Users":
-                user_email = [email for email, user in st.session_state['users'].items() 
-                            if user['name'] == selected_user][0]
-                filtered_history = filtered_history[filtered_history['uploaded_by'] == user_email]
-            
-            if "Document Statistics" in metrics:
-                report_data["Metrics"]["Document Statistics"] = {
-                    "Total Documents": len(filtered_history),
-                    "Status Distribution": filtered_history['status'].apply(
-                        lambda x: x.split()[0]).value_counts().to_dict(),
-                    "Analysis Rate": f"{(len(st.session_state['analyzed_docs'])/len(filtered_history)*100):.1f}%"
-                }
-            
-            if "User Activity" in metrics:
-                report_data["Metrics"]["User Activity"] = {
-                    "Active Users": len(filtered_history['uploaded_by'].unique()),
-                    "Documents per User": filtered_history['uploaded_by'].apply(
-                        lambda x: st.session_state['users'][x]['name']
-                    ).value_counts().to_dict()
-                }
-            
-            # Display and download options
-            st.json(report_data)
-            
-            # Export options
-            col1, col2 = st.columns([1, 4])
-            with col1:
-                if st.download_button(
-                    "📥 Download Report",
-                    data=json.dumps(report_data, indent=2),
-                    file_name=f"analytics_report_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                    mime="application/json"
-                ):
-                    st.success("Report downloaded successfully!")
+        show_reports_tab()
 
 def show_navigation():
     st.sidebar.title("Navigation 📱")
@@ -755,6 +3225,10 @@ def show_navigation():
     return "Upload"
 
 def main():
+    # Removal of expired documents runs on its own thread, not in the render path
+    get_expiration_scheduler()
+    get_metrics_server()
+    
     if not st.session_state['logged_in']:
         # Login page
         st.title("SignForMe.AI 📝")
@@ -0,0 +1,88 @@
+"""Shared fixtures: a scratch data directory, the mock Claude API and an AppTest factory.
+
+Everything runs locally. Each test gets its own working directory, so the
+app's relative paths (signforme.db, blobs/, ...) land in a temp dir, and the
+process-wide cache_resource singletons are cleared so they open those files.
+"""
+import io
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import streamlit_app
+from mock_claude_server import start_server
+
+USERS = {
+    'admin': ("maxhaiti@aol.com", "Admin123"),
+    'user': ("userpal@example.com", "System1234"),
+}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    yield tmp_path
+    st.cache_resource.clear()
+
+
+@pytest.fixture(scope="session")
+def mock_claude():
+    server = start_server(latency=0.0, chunk_delay=0.0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def store(workdir):
+    store = streamlit_app.DocumentStore(str(workdir / "signforme.db"))
+    yield store
+    store.conn.close()
+
+
+def add_document(store, content, uploaded_by, file_type="text/plain", name="document.txt"):
+    """Store content as a new pending document, as handle_document_upload does; returns the doc"""
+    content_hash, file_size = streamlit_app.BlobStore("blobs").put(io.BytesIO(content))
+    doc_id = store.next_doc_id()
+    upload_time = datetime.now().replace(microsecond=0)
+    doc = {'id': doc_id, 'name': name, 'status': 'Pending', 'upload_time': upload_time,
+           'file_type': file_type, 'file_size': file_size, 'content': None, 'analysis': None,
+           'uploaded_by': uploaded_by, 'content_hash': content_hash}
+    store.add_document(doc, {
+        'date': upload_time.strftime("%Y-%m-%d %H:%M:%S"), 'id': doc_id, 'name': name,
+        'status': "Pending ⏳", 'analysis': None, 'uploaded_by': uploaded_by
+    })
+    return doc
+
+
+@pytest.fixture
+def app(workdir, mock_claude):
+    """Return login(role) -> an AppTest of the app, logged in as that role"""
+    def login(role):
+        at = AppTest.from_file(APP, default_timeout=60)
+        at.secrets["CLAUDE_API_KEY"] = "test"
+        at.secrets["CLAUDE_API_URL"] = mock_claude.url
+        at.secrets["GMAIL_ADDRESS"] = "test@localhost"
+        at.secrets["GMAIL_APP_PASSWORD"] = "test"
+        # Nothing listens here; the notification worker just retries in the background
+        at.secrets["SMTP_HOST"] = "127.0.0.1"
+        at.secrets["SMTP_PORT"] = 9
+        at.secrets["SMTP_STARTTLS"] = False
+        at.run()
+        email, password = USERS[role]
+        at.text_input[0].input(email)
+        at.text_input[1].input(password)
+        at.button[0].click().run()
+        assert not at.exception, at.exception
+        return at
+    return login
@@ -0,0 +1,49 @@
+from conftest import USERS, add_document
+
+
+def test_binary_upload_is_not_sent_for_analysis(app, store, mock_claude):
+    email = USERS['user'][0]
+    doc = add_document(store, b"PK\x03\x04\x14\x00\x06\x00\x08\x00\xff\xfe binary",
+                       email, file_type="application/octet-stream", name="contract.docx")
+    requests_before = mock_claude.stats['requests']
+
+    at = app('user')
+    at.sidebar.radio[0].set_value("📤 Upload Documents").run()
+    at.button(key=f"analyze_{doc['id']}").click().run()
+
+    assert not at.exception, at.exception
+    assert any("Could not extract text from contract.docx" in error.value for error in at.error)
+    assert mock_claude.stats['requests'] == requests_before
+    assert not store.is_analyzed(doc['id'])
+
+
+def test_upload_page_lists_only_own_unanalyzed_documents(app, store):
+    own = add_document(store, b"my contract", USERS['user'][0], name="mine.txt")
+    other = add_document(store, b"someone else's contract", USERS['admin'][0], name="theirs.txt")
+
+    at = app('user')
+    at.sidebar.radio[0].set_value("📤 Upload Documents").run()
+    assert not at.exception, at.exception
+    keys = {button.key for button in at.button}
+    assert f"analyze_{own['id']}" in keys
+    assert f"analyze_{other['id']}" not in keys
+
+    at = app('admin')
+    at.sidebar.radio[0].set_value("📤 Upload Documents").run()
+    keys = {button.key for button in at.button}
+    assert {f"analyze_{own['id']}", f"analyze_{other['id']}"} <= keys
+
+
+def test_upload_page_is_paged(app, store):
+    docs = [add_document(store, f"contract {n}".encode(), USERS['user'][0], name=f"doc{n}.txt")
+            for n in range(30)]
+
+    at = app('user')
+    at.sidebar.radio[0].set_value("📤 Upload Documents").run()
+    shown = [button.key for button in at.button if button.key and button.key.startswith("analyze_SIGN")]
+    assert len(shown) == 25
+    assert at.button(key="analyze_all").label == "🔍 Analyze all (30)"
+
+    at.number_input(key="upload_page").set_value(2).run()
+    shown = [button.key for button in at.button if button.key and button.key.startswith("analyze_SIGN")]
+    assert shown == [f"analyze_{doc['id']}" for doc in docs[25:]]
@@ -0,0 +1,64 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import streamlit_app
+
+
+def read_entries(directory):
+    entries = []
+    for name in os.listdir(directory):
+        if name.startswith("audit.jsonl") and not name.endswith(".lock"):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                entries.extend(json.loads(line) for line in f)
+    return entries
+
+
+def test_concurrent_writers_rotate_without_losing_entries(store, workdir):
+    # Two logs on one directory stand in for two server processes
+    directory = str(workdir / "audit_log")
+    logs = [streamlit_app.AuditLog(store, directory, max_bytes=2000, backups=1000) for _ in range(2)]
+
+    def write(log, writer):
+        for n in range(200):
+            log.log(datetime.now(), 'upload', f"writer {writer} entry {n}", "userpal@example.com")
+            if n % 5 == 4:
+                log.flush()
+        log.flush()
+
+    threads = [threading.Thread(target=write, args=(log, writer)) for writer, log in enumerate(logs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    details = sorted(entry['details'] for entry in read_entries(directory))
+    assert details == sorted(f"writer {writer} entry {n}" for writer in range(2) for n in range(200))
+    assert store.action_counts()['action'] == {'upload': 400}
+
+
+def test_failed_count_is_retried_on_next_flush(store, workdir, monkeypatch):
+    log = streamlit_app.AuditLog(store, str(workdir / "audit_log"))
+    log.log(datetime.now(), 'upload', "first", "userpal@example.com")
+    count_actions = store.count_actions
+
+    def locked(entries):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, 'count_actions', locked)
+    try:
+        log.flush()
+    except sqlite3.OperationalError:
+        pass
+    # Written once, still counted as pending by the activity view
+    assert [entry['details'] for entry in read_entries(os.path.dirname(log.path))] == ["first"]
+    assert [entry['details'] for entry in log.unwritten_entries()] == ["first"]
+
+    monkeypatch.setattr(store, 'count_actions', count_actions)
+    log.log(datetime.now(), 'reject', "second", "maxhaiti@aol.com")
+    log.flush()
+    assert len(read_entries(os.path.dirname(log.path))) == 2
+    assert store.action_counts()['action'] == {'upload': 1, 'reject': 1}
+    assert log.unwritten_entries() == []
@@ -0,0 +1,83 @@
+import pytest
+
+import mock_claude_server
+import streamlit_app
+from mock_claude_server import start_server
+
+
+@pytest.fixture
+def server():
+    server = start_server(latency=0.0, chunk_delay=0.0, retry_after=0.01)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(streamlit_app.ClaudeClient, 'BASE_BACKOFF', 0.01)
+    monkeypatch.setattr(streamlit_app.ClaudeClient, 'COOLDOWN', 0.2)
+    return streamlit_app.ClaudeClient("test", server.url, timeout=5, metrics=streamlit_app.Metrics())
+
+
+def payload(text="Document content:\nThe parties agree to the payment terms"):
+    return streamlit_app.analysis_payload(text)
+
+
+def test_create_message(client):
+    body = client.create_message(payload())
+    assert body['content'][0]['text'].startswith("This document contains 7 words")
+    assert client.metrics.counters['claude_input_tokens'] > 0
+
+
+def test_stream_message_yields_the_whole_text(client, server):
+    expected = client.create_message(payload())['content'][0]['text']
+    chunks = list(client.stream_message(payload()))
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+    assert client.metrics.counters['claude_output_tokens'] > 0
+
+
+def test_rate_limited_calls_are_retried(client, server):
+    server.rate_limit_rate = 1.0
+    with pytest.raises(streamlit_app.ClaudeAPIError):
+        client.create_message(payload())
+    assert server.stats['rate_limited'] == client.MAX_RETRIES + 1
+    assert client.metrics.counters['claude_retries'] == client.MAX_RETRIES
+
+    server.rate_limit_rate = 0.0
+    client.create_message(payload())
+    assert client.consecutive_failures == 0
+
+
+def test_breaker_opens_then_recovers(client, server, monkeypatch):
+    monkeypatch.setattr(streamlit_app.ClaudeClient, 'MAX_RETRIES', 0)
+    server.error_rate = 1.0
+    for _ in range(client.FAILURE_THRESHOLD):
+        with pytest.raises(streamlit_app.ClaudeAPIError):
+            client.create_message(payload())
+    requests = server.stats['requests']
+    with pytest.raises(streamlit_app.CircuitOpenError):
+        client.create_message(payload())
+    assert server.stats['requests'] == requests
+
+    server.error_rate = 0.0
+    monkeypatch.setattr(streamlit_app.ClaudeClient, 'COOLDOWN', 0.0)
+    client.create_message(payload())
+    assert client.opened_at is None
+    assert client.consecutive_failures == 0
+
+
+def test_client_error_closes_a_half_open_breaker(client, monkeypatch):
+    def bad_request(handler):
+        handler.rfile.read(int(handler.headers.get("content-length", 0)))
+        handler._send_json(400, {"type": "error", "error": {"type": "invalid_request_error",
+                                                             "message": "prompt is too long"}})
+
+    monkeypatch.setattr(mock_claude_server.MockClaudeHandler, 'do_POST', bad_request)
+    client.opened_at = 0.0
+    client.consecutive_failures = client.FAILURE_THRESHOLD
+    with pytest.raises(streamlit_app.ClaudeAPIError) as error:
+        client.create_message(payload())
+    assert not isinstance(error.value, streamlit_app.CircuitOpenError)
+    assert client.opened_at is None
+    assert client.consecutive_failures == 0
@@ -0,0 +1,52 @@
+import threading
+from datetime import datetime
+
+import streamlit_app
+from conftest import USERS, add_document
+
+
+def test_set_statuses_moves_only_pending_documents(store):
+    docs = [add_document(store, f"contract {n}".encode(), USERS['user'][0]) for n in range(3)]
+    ids = [doc['id'] for doc in docs]
+
+    assert store.set_statuses(ids[:2], 'Authorized', datetime.now()) == ids[:2]
+    assert store.set_statuses(ids, 'Rejected', datetime.now()) == ids[2:]
+    assert [store.get_document(doc_id)['status'] for doc_id in ids] == ['Authorized', 'Authorized', 'Rejected']
+    assert store.analytics_summary()['status'] == {'Authorized': 2, 'Rejected': 1}
+
+
+def test_concurrent_decisions_move_each_document_once(store, workdir):
+    docs = [add_document(store, f"contract {n}".encode(), USERS['user'][0]) for n in range(60)]
+    ids = [doc['id'] for doc in docs]
+    # Separate stores on the same file stand in for admins in different server processes
+    stores = [streamlit_app.DocumentStore(str(workdir / "signforme.db")) for _ in range(6)]
+    statuses = ['Authorized', 'Rejected'] * 3
+    moved = {}
+    start = threading.Barrier(len(stores))
+
+    def decide(index):
+        start.wait()
+        # Each admin works through the same documents in a different order
+        order = ids[index * 10:] + ids[:index * 10]
+        moved[index] = [doc_id for begin in range(0, len(order), 7)
+                        for doc_id in stores[index].set_statuses(order[begin:begin + 7], statuses[index],
+                                                                 datetime.now())]
+
+    threads = [threading.Thread(target=decide, args=(index,)) for index in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [doc_id for index in moved for doc_id in moved[index]]
+    assert sorted(winners) == sorted(ids)
+    for index, doc_ids in moved.items():
+        for doc_id in doc_ids:
+            assert store.get_document(doc_id)['status'] == statuses[index]
+            history, = [row for row in store.list_history() if row['id'] == doc_id]
+            assert history['status'].split()[0] == statuses[index]
+    summary = store.analytics_summary()
+    assert summary['status'].get('Pending', 0) == 0
+    assert sum(summary['status'].values()) == len(ids)
+    for other in stores:
+        other.conn.close()
@@ -0,0 +1,155 @@
+import email
+import socket
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import streamlit_app
+
+ADMIN = "admin@example.com"
+
+
+class Inbox:
+    """aiosmtpd handler keeping every delivered message"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def smtp():
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, inbox
+    controller.stop()
+
+
+@pytest.fixture
+def worker(store, smtp):
+    controller, _ = smtp
+    workers = []
+
+    def start(**options):
+        worker = streamlit_app.NotificationWorker(
+            store, controller.hostname, controller.port, "app@example.com", use_tls=False, **options
+        )
+        worker.POLL_INTERVAL = 0.1
+        worker.start()
+        workers.append(worker)
+        return worker
+    yield start
+    for worker in workers:
+        worker.stop()
+        worker.join(5)
+
+
+def test_outbox_messages_are_delivered(store, smtp, worker):
+    _, inbox = smtp
+    store.enqueue_email(ADMIN, "Document Approved: a.txt", "Your document has been approved", datetime.now())
+    worker()
+
+    wait_for(lambda: store.count_emails('sent') == 1)
+    assert len(inbox.messages) == 1
+    assert inbox.messages[0]['To'] == ADMIN
+    assert inbox.messages[0]['Subject'] == "Document Approved: a.txt"
+    assert store.count_emails('queued') == 0
+
+
+def test_failed_send_is_retried_later(store):
+    # Nothing listens on this port
+    worker = streamlit_app.NotificationWorker(store, "127.0.0.1", free_port(), "app@example.com", use_tls=False)
+    store.enqueue_email(ADMIN, "Subject", "Body", datetime.now())
+    message, = store.claim_due_emails(datetime.now(), worker.LEASE)
+    worker._deliver(message)
+
+    row = store.conn.execute("SELECT status, attempts, next_attempt, last_error FROM outbox").fetchone()
+    assert row['status'] == 'queued'
+    assert row['attempts'] == 1
+    assert row['last_error']
+    assert datetime.fromisoformat(row['next_attempt']) > datetime.now()
+
+
+def test_notifications_are_released_as_one_digest(store, smtp, worker):
+    _, inbox = smtp
+    now = datetime.now()
+    for n in range(3):
+        store.queue_notification(ADMIN, 'upload', f"New Document Upload: doc{n}.txt", f"Document {n}", now)
+    store.queue_notification(ADMIN, 'analyze', "Document Analysis Completed: doc0.txt", "Done", now)
+    worker(digest_window=timedelta(0))
+
+    wait_for(lambda: store.count_emails('sent') == 1)
+    assert store.count_notifications() == 0
+    digest, = inbox.messages
+    assert digest['Subject'] == "SignForMe.AI digest: 4 notifications"
+    body = digest.get_payload()[0].get_payload(decode=True).decode()
+    assert "3 upload, 1 analyze" in body
+    assert all(f"New Document Upload: doc{n}.txt" in body for n in range(3))
+
+
+def test_digest_waits_for_the_window(store):
+    worker = streamlit_app.NotificationWorker(store, "127.0.0.1", 9, "app@example.com",
+                                              digest_window=timedelta(minutes=5))
+    queued_at = datetime.now()
+    store.queue_notification(ADMIN, 'upload', "Subject", "Body", queued_at)
+
+    worker.release_digests(queued_at + timedelta(minutes=4))
+    assert store.count_emails('queued') == 0
+    worker.release_digests(queued_at + timedelta(minutes=5))
+    assert store.count_emails('queued') == 1
+    assert store.count_notifications() == 0
+
+
+def test_rate_cap_holds_notifications_back(store):
+    worker = streamlit_app.NotificationWorker(store, "127.0.0.1", 9, "app@example.com",
+                                              digest_window=timedelta(0), max_per_hour=1)
+    now = datetime.now()
+    store.enqueue_email(ADMIN, "Earlier", "Body", now - timedelta(minutes=30))
+    store.queue_notification(ADMIN, 'upload', "Subject", "Body", now)
+
+    worker.release_digests(now)
+    assert store.count_notifications() == 1
+    worker.release_digests(now + timedelta(minutes=31))
+    assert store.count_notifications() == 0
+    assert store.count_emails('queued') == 2
+
+
+def test_worker_survives_store_errors(store, smtp, worker, monkeypatch):
+    _, inbox = smtp
+    claim = store.claim_due_emails
+    failures = []
+
+    def flaky(*args):
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return claim(*args)
+
+    monkeypatch.setattr(store, 'claim_due_emails', flaky)
+    monkeypatch.setattr(streamlit_app.NotificationWorker, 'ERROR_BACKOFF', 0.1)
+    store.enqueue_email(ADMIN, "Subject", "Body", datetime.now())
+    running = worker()
+
+    wait_for(lambda: len(inbox.messages) == 1)
+    assert running.is_alive()
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timedelta
+
+import streamlit_app
+from conftest import USERS, add_document
+
+
+def expire(scheduler, doc):
+    scheduler.schedule(doc['id'], datetime.now() - timedelta(seconds=1))
+    scheduler._remove_due(datetime.now())
+
+
+def test_blob_is_deleted_with_its_last_document(store):
+    blobs = streamlit_app.BlobStore("blobs")
+    blobs.GRACE = 0
+    # The same content uploaded by two users is stored once
+    first = add_document(store, b"shared contract", USERS['user'][0])
+    second = add_document(store, b"shared contract", USERS['admin'][0])
+    path = blobs.path(first['content_hash'])
+    os.makedirs(os.path.dirname(blobs.text_path(first['content_hash'])))
+    with open(blobs.text_path(first['content_hash']), 'w') as f:
+        f.write("shared contract")
+    scheduler = streamlit_app.ExpirationScheduler(store, {}, blobs)
+
+    expire(scheduler, first)
+    assert os.path.exists(path)
+    expire(scheduler, second)
+    assert not os.path.exists(path)
+    assert not os.path.exists(blobs.text_path(first['content_hash']))
+
+
+def test_blob_inside_grace_is_retried(store):
+    blobs = streamlit_app.BlobStore("blobs")
+    doc = add_document(store, b"recent contract", USERS['user'][0])
+    scheduler = streamlit_app.ExpirationScheduler(store, {}, blobs)
+
+    expire(scheduler, doc)
+    assert os.path.exists(blobs.path(doc['content_hash']))
+    assert scheduler.orphaned_blobs == {doc['content_hash']}
+
+    blobs.GRACE = 0
+    scheduler._remove_due(datetime.now())
+    assert not os.path.exists(blobs.path(doc['content_hash']))
+    assert scheduler.orphaned_blobs == set()
+
+
+def test_orphan_check_uses_an_index(store):
+    plan = store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT EXISTS (SELECT 1 FROM documents WHERE content_hash = ?)", ("x",)
+    ).fetchall()
+    assert any("idx_documents_hash" in row[-1] for row in plan)
@@ -0,0 +1,94 @@
+"""Text extractors for uploaded documents, keyed by MIME type.
+
+This lives outside streamlit_app.py so the functions can be pickled into a
+ProcessPoolExecutor; it must not import streamlit. Register a new format with
+
+    @register_extractor("application/x-foo")
+    def extract_foo(path):
+        return "..."
+"""
+import logging
+import mmap
+import os
+import tempfile
+
+EXTRACTORS = {}
+
+
+def register_extractor(*mime_types):
+    """Decorator registering a path -> text function for the given MIME types"""
+    def decorator(func):
+        for mime_type in mime_types:
+            EXTRACTORS[mime_type] = func
+        return func
+    return decorator
+
+
+@register_extractor("text/plain", "text/markdown", "text/csv", "text/html",
+                    "application/json", "application/xml")
+def extract_plain_text(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                return str(data, 'utf-8')
+            except UnicodeDecodeError:
+                return str(data, 'latin-1')
+
+
+@register_extractor("application/pdf")
+def extract_pdf(path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return "\n\n".join(page.extract_text() or '' for page in reader.pages)
+
+
+@register_extractor("application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+def extract_docx(path):
+    import docx
+
+    document = docx.Document(path)
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append("\t".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+
+def extract_file(path, mime_type):
+    """Extract text from path; '' if the type is unsupported or its extractor fails.
+
+    Only text types are decoded as text. The raw bytes of a PDF or DOCX are not
+    text, and passing them on would only get garbage analyzed.
+    """
+    extractor = EXTRACTORS.get(mime_type)
+    if extractor is None and mime_type and mime_type.startswith("text/"):
+        extractor = extract_plain_text
+    if extractor is None:
+        logging.warning("No text extractor for %s (%s)", path, mime_type)
+        return ''
+    try:
+        return extractor(path)
+    except Exception as e:
+        logging.warning("Extracting %s as %s failed: %s", path, mime_type, e)
+        return ''
+
+
+def extract_to_file(path, mime_type, text_path):
+    """Extract path into text_path (UTF-8), written atomically.
+
+    The text goes to disk rather than back through the pool, so large
+    documents are not pickled between processes.
+    """
+    if os.path.exists(text_path):
+        return text_path
+    text = extract_file(path, mime_type)
+    directory = os.path.dirname(text_path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', errors='replace',
+                                     dir=directory, delete=False) as tmp:
+        tmp.write(text)
+    os.replace(tmp.name, text_path)
+    return text_path
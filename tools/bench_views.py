@@ -0,0 +1,228 @@
+"""Render-time benchmarks for the views of streamlit_app.py.
+
+For each size, a throwaway database is seeded with that many synthetic
+documents (plus their history rows, user actions and processing times), and
+every view is rendered through streamlit.testing.v1.AppTest as a logged-in
+admin. Claude calls go to the local mock server and SMTP to a closed local
+port, so nothing leaves the machine. Wall time is the median of --repeat warm
+reruns of the view; peak memory is the tracemalloc peak of one more rerun.
+
+    python tools/bench_views.py --sizes 10 1000 100000 --save tools/benchmarks/views.json
+    python tools/bench_views.py --sizes 10 1000 --compare tools/benchmarks/views.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import streamlit as st
+import streamlit.logger
+from streamlit.testing.v1 import AppTest
+
+import streamlit_app
+from mock_claude_server import start_server
+
+VIEWS = {
+    "Upload": "📤 Upload Documents",
+    "Status": "📋 Document Status",
+    "History": "📚 Document History",
+    "Analytics": "📊 Analytics Dashboard",
+}
+ADMIN = {'email': 'maxhaiti@aol.com', 'role': 'admin', 'name': 'Maxi Raymonville'}
+KNOWN_USERS = ['maxhaiti@aol.com', 'userpal@example.com', 'jimkalinov@example.com']
+STATUSES = ['Pending', 'Authorized', 'Rejected']
+EMOJIS = {'Pending': '⏳', 'Authorized': '✅', 'Rejected': '❌'}
+
+
+def seed_database(path, size, days=90, seed=0):
+    """Fill a new database at path with size documents spread over the last days"""
+    rng = random.Random(seed)
+    store = streamlit_app.DocumentStore(path)
+    # Mostly the real accounts, plus uploaders the user directory doesn't know
+    uploaders = KNOWN_USERS + [f"user{n}@bench.local" for n in range(min(50, max(1, size // 100)))]
+    now = datetime.now().replace(microsecond=0)
+    documents, history, actions, action_times = [], [], [], []
+    for n in range(size):
+        doc_id = f"SIGN{n + 1:03d}"
+        uploaded_by = rng.choice(uploaders)
+        upload_time = now - timedelta(seconds=rng.randrange(days * 86400))
+        status = rng.choices(STATUSES, weights=[2, 5, 1])[0]
+        analysis = (f"SUMMARY: synthetic analysis of document {n}" if rng.random() < 0.6 else None)
+        documents.append((doc_id, f"document_{n}.txt", status, upload_time.isoformat(sep=' '),
+                          'text/plain', rng.randrange(1, 200000), None, analysis, uploaded_by,
+                          None, f"{n:064x}"))
+        date = upload_time
+        actions.append((upload_time.isoformat(sep=' '), 'upload',
+                        f"Document uploaded by {uploaded_by}: document_{n}.txt", uploaded_by))
+        if status != 'Pending':
+            date = upload_time + timedelta(seconds=rng.randrange(60, 3 * 86400))
+            date = min(date, now)
+            action_times.append((upload_time.isoformat(sep=' '), date.isoformat(sep=' ')))
+            actions.append((date.isoformat(sep=' '), 'authorize' if status == 'Authorized' else 'reject',
+                            f"{status} document: document_{n}.txt", ADMIN['email']))
+        history.append((date.strftime("%Y-%m-%d %H:%M:%S"), doc_id, f"document_{n}.txt",
+                        f"{status} {EMOJIS[status]}", analysis, uploaded_by))
+
+    conn = store.conn
+    with store._transaction():
+        conn.executemany(
+            f"INSERT INTO documents ({', '.join(store.DOCUMENT_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(store.DOCUMENT_COLUMNS))})", documents
+        )
+        conn.executemany(
+            f"INSERT INTO history ({', '.join(store.HISTORY_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(store.HISTORY_COLUMNS))})", history
+        )
+        conn.executemany(
+            "INSERT INTO user_actions (timestamp, action, details, user) VALUES (?, ?, ?, ?)", actions
+        )
+        conn.executemany("INSERT INTO action_times (upload_time, action_time) VALUES (?, ?)", action_times)
+        conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('doc_id', ?)", (size,))
+        store._rebuild_analytics()
+        store._rebuild_processing_times()
+        store._rebuild_action_counts()
+    store.mark_all_history_days_dirty()
+    store.conn.close()
+
+
+def render(at, label):
+    start = time.perf_counter()
+    at.sidebar.radio[0].set_value(label).run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"{label} raised: {at.exception[0].message}")
+    return elapsed
+
+
+def bench_size(size, workdir, secrets, repeat):
+    """{view: {'first_ms', 'wall_ms', 'peak_mb'}} for one database size"""
+    directory = tempfile.mkdtemp(prefix=f"bench{size}_", dir=workdir)
+    db_path = os.path.join(directory, "signforme.db")
+    started = time.perf_counter()
+    seed_database(db_path, size)
+    print(f"seeded {size} documents in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    # Process-wide resources (store, archive, caches) must point at this size's files
+    st.cache_resource.clear()
+    secrets = dict(secrets, DB_PATH=db_path,
+                   HISTORY_DIR=os.path.join(directory, "history_parquet"),
+                   BLOB_DIR=os.path.join(directory, "blobs"),
+                   ANALYSIS_CACHE_DIR=os.path.join(directory, "analysis_cache"),
+                   EXPORT_DIR=os.path.join(directory, "exports"),
+                   AUDIT_LOG_DIR=os.path.join(directory, "audit_log"))
+
+    results = {}
+    for view, label in VIEWS.items():
+        at = AppTest.from_file(APP, default_timeout=600)
+        for name, value in secrets.items():
+            at.secrets[name] = value
+        at.session_state['logged_in'] = True
+        at.session_state['current_user'] = dict(ADMIN)
+        at.run()
+        # The first render of a view includes one-off work such as building Parquet partitions
+        first = render(at, label)
+        times = [render(at, label) for _ in range(repeat)]
+        tracemalloc.start()
+        render(at, label)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[view] = {
+            'first_ms': round(first * 1000, 1),
+            'wall_ms': round(statistics.median(times) * 1000, 1),
+            'peak_mb': round(peak / 2 ** 20, 2),
+        }
+        print(f"{size:>7} {view:<10} first {results[view]['first_ms']:>9.1f} ms  "
+              f"warm {results[view]['wall_ms']:>9.1f} ms  peak {results[view]['peak_mb']:>8.2f} MB",
+              file=sys.stderr)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print each measurement next to the baseline's, with the relative change"""
+    print(f"Compared with baseline from commit {baseline.get('commit')} ({baseline.get('created')})")
+    print(f"{'size':>7} {'view':<10} {'metric':<8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, views in results.items():
+        for view, metrics in views.items():
+            before = baseline['results'].get(size, {}).get(view)
+            if before is None:
+                continue
+            for metric, value in metrics.items():
+                old = before.get(metric)
+                if not old:
+                    continue
+                print(f"{size:>7} {view:<10} {metric:<8} {old:>10} {value:>10} "
+                      f"{(value - old) / old * 100:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3, help="warm reruns timed per view")
+    parser.add_argument("--workdir", help="where the synthetic databases go (default: a temp dir)")
+    parser.add_argument("--save", help="write the results to this JSON file as a baseline")
+    parser.add_argument("--compare", help="baseline JSON file to compare the results with")
+    args = parser.parse_args()
+
+    # Seeding runs the store outside a script run; that is expected here
+    streamlit.logger.set_log_level("error")
+    save, baseline = (args.save and os.path.abspath(args.save)), (args.compare and os.path.abspath(args.compare))
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_views_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    server = start_server(latency=0.0, chunk_delay=0.0)
+    secrets = {
+        "CLAUDE_API_KEY": "benchmark",
+        "CLAUDE_API_URL": server.url,
+        "GMAIL_ADDRESS": "benchmark@localhost",
+        "GMAIL_APP_PASSWORD": "benchmark",
+        # Nothing is emailed while rendering; if something were, it would fail locally
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": 9,
+        "SMTP_STARTTLS": False,
+    }
+
+    results = {str(size): bench_size(size, workdir, secrets, args.repeat) for size in args.sizes}
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'streamlit': st.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+    if baseline:
+        with open(baseline) as f:
+            compare(results, json.load(f))
+    if save:
+        os.makedirs(os.path.dirname(save), exist_ok=True)
+        with open(save, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Load test for the document pipeline against the mock Claude API.
+
+Each simulated upload goes through the same steps as in the app: ingestion
+into the blob store and database, text extraction in the process pool, the
+Claude analysis (map/reduce for long documents, optionally streamed) and the
+analysis + status update of the document and its history. Documents run
+--concurrency at a time; the report gives throughput, p50/p95/p99 latency per
+stage and error counts. Everything runs locally:
+
+    python tools/load_test.py --documents 200 --concurrency 8 --latency 0.3 --rate-limit-rate 0.05
+
+Pass --url to aim at an already running server (e.g. tools/mock_claude_server.py)
+instead of the in-process one.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_claude_server import start_server
+
+STAGES = ['ingest', 'extract', 'analyze', 'update', 'total']
+WORDS = ("agreement party shall payment term notice date signature obligation clause "
+         "contract invoice amount delivery schedule liability termination").split()
+
+
+class Unlimited:
+    """Stand-in for TokenBucket when the test should not be rate limited client side"""
+
+    def acquire(self):
+        pass
+
+
+def synthetic_document(index, size, rng):
+    """size characters of plain text, unique per index so nothing is deduplicated"""
+    words = [f"Document {index}."]
+    length = len(words[0])
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size].encode()
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    if len(values) == 1:
+        cuts = values * 99
+    else:
+        cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {'p50': round(cuts[49] * 1000, 1), 'p95': round(cuts[94] * 1000, 1),
+            'p99': round(cuts[98] * 1000, 1), 'max': round(max(values) * 1000, 1)}
+
+
+def run(args):
+    import streamlit.logger
+    import streamlit_app
+    # Worker threads read settings outside a script run; that is expected here
+    streamlit.logger.set_log_level("error")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="load_test_")
+    os.makedirs(workdir, exist_ok=True)
+    store = streamlit_app.DocumentStore(os.path.join(workdir, "signforme.db"))
+    blobs = streamlit_app.BlobStore(os.path.join(workdir, "blobs"))
+    pool = ProcessPoolExecutor(max_workers=args.extraction_workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                              chunk_delay=args.chunk_delay)
+        url = server.url
+    client = streamlit_app.ClaudeClient("load-test", url, pool_size=max(10, args.concurrency),
+                                        timeout=args.timeout)
+    limiter = (streamlit_app.TokenBucket(args.rate_per_minute / 60, capacity=args.concurrency)
+               if args.rate_per_minute else Unlimited())
+    rng = random.Random(args.seed)
+    documents = [synthetic_document(n, args.size, rng) for n in range(args.documents)]
+    # Warm the pool up so process start-up is not billed to the first documents
+    pool.submit(int).result()
+
+    timings = defaultdict(list)
+    errors = Counter()
+    lock = threading.Lock()
+
+    def process(index, content):
+        stage_times = {}
+        started = mark = time.perf_counter()
+
+        def lap(stage):
+            nonlocal mark
+            now = time.perf_counter()
+            stage_times[stage] = now - mark
+            mark = now
+
+        content_hash, file_size = blobs.put(io.BytesIO(content))
+        doc_id = store.next_doc_id()
+        upload_time = datetime.now()
+        doc = {'id': doc_id, 'name': f"load_test_{index}.txt", 'status': 'Pending',
+               'upload_time': upload_time, 'file_type': 'text/plain', 'file_size': file_size,
+               'content': None, 'analysis': None, 'uploaded_by': 'userpal@example.com',
+               'content_hash': content_hash}
+        store.add_document(doc, {
+            'date': upload_time.strftime("%Y-%m-%d %H:%M:%S"), 'id': doc_id, 'name': doc['name'],
+            'status': "Pending ⏳", 'analysis': None, 'uploaded_by': doc['uploaded_by']
+        })
+        streamlit_app.start_text_extraction(doc, blobs, pool)
+        lap('ingest')
+
+        text = streamlit_app.extract_text_content(doc, blobs, pool)
+        lap('extract')
+
+        if args.stream:
+            analysis = "".join(streamlit_app.stream_analysis(text, client, limiter))
+        else:
+            analysis = streamlit_app.request_analysis(text, client, limiter)
+        lap('analyze')
+
+        store.set_analyses({doc_id: analysis})
+        store.set_status(doc_id, 'Authorized', datetime.now())
+        lap('update')
+        stage_times['total'] = time.perf_counter() - started
+        with lock:
+            for stage, seconds in stage_times.items():
+                timings[stage].append(seconds)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(process, index, content) for index, content in enumerate(documents)]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors[type(e).__name__] += 1
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+
+    completed = len(timings['total'])
+    report = {
+        'documents': args.documents,
+        'concurrency': args.concurrency,
+        'document_chars': args.size,
+        'stream': args.stream,
+        'elapsed_s': round(elapsed, 2),
+        'completed': completed,
+        'failed': sum(errors.values()),
+        'analyses_per_minute': round(completed / elapsed * 60, 1),
+        'latency_ms': {stage: percentiles(timings[stage]) for stage in STAGES},
+        'errors': dict(errors),
+    }
+    if server is not None:
+        report['server'] = dict(server.stats)
+        server.shutdown()
+    return report
+
+
+def print_report(report):
+    print(f"{report['completed']}/{report['documents']} documents in {report['elapsed_s']}s "
+          f"at concurrency {report['concurrency']}: {report['analyses_per_minute']} analyses/minute")
+    print(f"{'stage':<8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for stage, latency in report['latency_ms'].items():
+        print(f"{stage:<8} " + " ".join(f"{latency[key] if latency[key] is not None else '-':>10}"
+                                         for key in ('p50', 'p95', 'p99', 'max')))
+    if report['errors']:
+        print("errors: " + ", ".join(f"{name} x{count}" for name, count in report['errors'].items()))
+    if 'server' in report:
+        print("server: " + ", ".join(f"{name} {count}" for name, count in report['server'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4, help="documents in flight at once")
+    parser.add_argument("--size", type=int, default=5000, help="characters per synthetic document")
+    parser.add_argument("--stream", action="store_true", help="stream analyses, as the single-document view does")
+    parser.add_argument("--rate-per-minute", type=float, default=0,
+                        help="client-side limit like ANALYSIS_RATE_PER_MINUTE (default: none)")
+    parser.add_argument("--extraction-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=30, help="Claude request timeout")
+    parser.add_argument("--url", help="Messages API URL to use instead of an in-process mock server")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock server latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="where the database and blobs go (default: a temp dir)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
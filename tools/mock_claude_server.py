@@ -0,0 +1,181 @@
+"""Local stand-in for the Claude Messages API.
+
+Serves POST /v1/messages with either a JSON body or, when the request sets
+"stream": true, the same server-sent event sequence the real API sends
+(message_start, content_block_delta, ..., message_stop). Latency, error rate
+and 429 behavior are configurable, so the app can be exercised with no
+network access:
+
+    python tools/mock_claude_server.py --port 8787 --latency 0.5 --rate-limit-rate 0.1
+
+and in .streamlit/secrets.toml:
+
+    CLAUDE_API_KEY = "test"
+    CLAUDE_API_URL = "http://127.0.0.1:8787/v1/messages"
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockClaudeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, chunk_delay=0.02):
+        super().__init__(address, MockClaudeHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.chunk_delay = chunk_delay
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/messages"
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def summarize(prompt):
+    """Deterministic stand-in for a model summary"""
+    text = prompt.split("Document content:", 1)[-1]
+    words = re.findall(r"\w+", text)
+    return (f"This document contains {len(words)} words and {len(text)} characters. "
+            f"It begins with: {' '.join(words[:8]) or 'no readable text'}.")
+
+
+class MockClaudeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, event, payload):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        server.count('requests')
+
+        if random.random() < server.rate_limit_rate:
+            server.count('rate_limited')
+            self._send_json(429, {
+                "type": "error",
+                "error": {"type": "rate_limit_error", "message": "Rate limited by mock server"}
+            }, headers={"retry-after": str(server.retry_after)})
+            return
+
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        if random.random() < server.error_rate:
+            server.count('errors')
+            self._send_json(529, {
+                "type": "error",
+                "error": {"type": "overloaded_error", "message": "Overloaded (mock server)"}
+            })
+            return
+
+        prompt = "".join(
+            message["content"] for message in request.get("messages", [])
+            if isinstance(message.get("content"), str)
+        )
+        text = summarize(prompt)
+        usage = {"input_tokens": max(1, len(prompt) // 4), "output_tokens": max(1, len(text) // 4)}
+        server.count('ok')
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "msg_mock",
+                "type": "message",
+                "role": "assistant",
+                "model": request.get("model"),
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self._send_event("message_start", {
+            "type": "message_start",
+            "message": {"id": "msg_mock", "type": "message", "role": "assistant", "content": [],
+                        "model": request.get("model"),
+                        "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0}}
+        })
+        self._send_event("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+        })
+        for chunk in re.findall(r"\S+\s*", text):
+            time.sleep(server.chunk_delay)
+            self._send_event("content_block_delta", {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": chunk}
+            })
+        self._send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._send_event("message_delta", {
+            "type": "message_delta", "delta": {"stop_reason": "end_turn"},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        })
+        self._send_event("message_stop", {"type": "message_stop"})
+        self.close_connection = True
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a MockClaudeServer on a background thread and return it"""
+    server = MockClaudeServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-claude", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 529 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after sent with 429s")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between stream deltas")
+    args = parser.parse_args()
+
+    server = MockClaudeServer(
+        (args.host, args.port), latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, chunk_delay=args.chunk_delay
+    )
+    print(f"Mock Claude API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()